@@ -0,0 +1,233 @@
+"""
+this file contains the batch engine class, which runs many tetris games at once in lockstep
+
+the state of every game is kept in numpy arrays, with one row per game, and moves, rotations,
+gravity, collisions, line clears and scoring are done as array operations across all games
+
+the batch engine follows the same rules as Engine, games with the same seed and
+actions end up in exactly the same state in both engines
+
+this file requires numpy
+"""
+from Shape import SHAPES
+from Settings import Dim,Game_settings,Scoring,Movement
+from Engine import Engine
+from Pieces import Piece_generator
+
+import math
+import numpy as np
+
+#action codes passed to step(), code 0 does nothing, the rest are the actions in Engine.ACTIONS
+ACTIONS = (None,) + Engine.ACTIONS
+NONE,LEFT,RIGHT,DOWN,ROTATE,DROP = range(len(ACTIONS))
+
+#blocks start at the top middle of the board, in heap coords
+SPAWN_X = int(Dim.BOARD_W/2)
+SPAWN_Y = Dim.BOARD_H + 1
+
+def build_tables():
+    """
+        build the tables of cell offsets for every shape and rotation
+        shapes with less than 4 rotations repeat them, so rotation r of a shape is rotation r % rotations
+    """
+    cells_x = np.zeros((len(SHAPES),4,4),dtype = np.int64)
+    cells_y = np.zeros((len(SHAPES),4,4),dtype = np.int64)
+    for i,shape in enumerate(SHAPES):
+        for r in range(4):
+            for j,(x,y) in enumerate(shape.ROTATIONS[r % len(shape.ROTATIONS)].coords):
+                cells_x[i,r,j] = x
+                cells_y[i,r,j] = y
+    rotations = np.array([len(shape.ROTATIONS) for shape in SHAPES],dtype = np.int64)
+    symbols = np.array([ord(shape.symbol) for shape in SHAPES],dtype = np.uint8)
+    return cells_x,cells_y,rotations,symbols
+
+CELLS_X,CELLS_Y,ROTATIONS,SYMBOLS = build_tables()
+
+#rows the heap needs, blocks can land above the top of the board before the game is lost
+HEAP_H = SPAWN_Y + int(CELLS_Y.max()) + 1
+
+POINTS = np.array([Scoring.POINTS[i] for i in range(len(Scoring.POINTS))],dtype = np.int64)
+
+
+class Batch_engine():
+    """
+    The Batch_engine class describes a batch of n tetris games
+
+    the games are described by the following arrays, indexed by game
+        heap: (n,HEAP_H,BOARD_W) uint8 array, the symbol at each [x,y] in the heap, 0 if its empty
+        shape,rotation: the falling blocks shape index in SHAPES, and rotation index
+        x,y: the falling blocks location, in heap coords
+        next_shape: shape index of the next block
+        pieces: the piece generator of each game, the same as the one Screen uses
+        score,level,total_lines_cleared,ticks,game_speed: the same as in Engine
+        game_over: true for games that have been lost and not reset
+
+    games that are lost are reset at the end of step() when auto_reset is set,
+        game i is restarted with seed seeds[i] + n, so its k-th game uses seed seeds[i] + k x n
+    """
+
+    def __init__(self,seeds,auto_reset = True,piece_mode = Game_settings.PIECE_MODE):
+        self.n = len(seeds)
+        self.auto_reset = auto_reset
+        self.piece_mode = piece_mode
+        n = self.n
+        self.heap = np.zeros((n,HEAP_H,Dim.BOARD_W),dtype = np.uint8)
+        self.shape = np.zeros(n,dtype = np.int64)
+        self.rotation = np.zeros(n,dtype = np.int64)
+        self.x = np.zeros(n,dtype = np.int64)
+        self.y = np.zeros(n,dtype = np.int64)
+        self.next_shape = np.zeros(n,dtype = np.int64)
+        self.score = np.zeros(n,dtype = np.int64)
+        self.level = np.zeros(n,dtype = np.int64)
+        self.total_lines_cleared = np.zeros(n,dtype = np.int64)
+        self.ticks = np.zeros(n,dtype = np.int64)
+        self.game_speed = np.full(n,Game_settings.STARTING_SPEED,dtype = np.float64)
+        self.game_over = np.zeros(n,dtype = bool)
+        self.seeds = list(seeds)
+        self.pieces = [None]*n
+        self.reset()
+
+    def reset(self,games = None,seeds = None):
+        """reset games (all games when None), using seeds or the games current seeds"""
+        games = range(self.n) if games is None else games
+        for j,i in enumerate(games):
+            if seeds is not None:
+                self.seeds[i] = seeds[j]
+            #shapes are picked in the same order as Screen picks them
+            self.pieces[i] = Piece_generator(self.seeds[i],self.piece_mode)
+            self.shape[i] = self.pieces[i].next_index()
+            self.next_shape[i] = self.pieces[i].peek()[0]
+        games = np.asarray(list(games),dtype = np.int64)
+        self.heap[games] = 0
+        self.rotation[games] = 0
+        self.x[games] = SPAWN_X
+        self.y[games] = SPAWN_Y
+        self.score[games] = 0
+        self.level[games] = 0
+        self.total_lines_cleared[games] = 0
+        self.ticks[games] = 0
+        self.game_speed[games] = Game_settings.STARTING_SPEED
+        self.game_over[games] = False
+
+    def step(self,actions):
+        """
+            do actions[i] (an action code) in game i, followed by one gravity tick in every game
+            returns (rewards,done), the score gained and whether the game was lost during this step
+            the final scores of lost games can be read from last_score before they are reset
+        """
+        actions = np.asarray(actions)
+        score = self.score.copy()
+        active = ~self.game_over
+
+        self.move(np.nonzero(active & (actions == LEFT))[0],-1)
+        self.move(np.nonzero(active & (actions == RIGHT))[0],1)
+        self.down(np.nonzero(active & (actions == DOWN))[0])
+        self.rotate(np.nonzero(active & (actions == ROTATE))[0])
+        self.drop(np.nonzero(active & (actions == DROP))[0])
+        self.tick()
+
+        rewards = self.score - score
+        done = self.game_over & active
+        self.last_score = self.score.copy()
+        if self.auto_reset and done.any():
+            games = np.nonzero(done)[0]
+            self.reset(games,[self.seeds[i] + self.n for i in games])
+        return rewards,done
+
+    def tick(self):
+        """move every falling block down one row, then clear full rows and update the score and level"""
+        games = np.nonzero(~self.game_over)[0]
+        self.ticks[games] += 1
+        self.down(games)
+
+        games = games[~self.game_over[games]]
+        full = (self.heap[games] != 0).all(axis = 2)
+        rows_cleared = full.sum(axis = 1)
+
+        #score = multiplier x (level + 1), using the level before this tick
+        self.score[games] += POINTS[rows_cleared] * (self.level[games] + 1)
+        self.total_lines_cleared[games] += rows_cleared
+        level_up = games[self.total_lines_cleared[games] - self.level[games]*Game_settings.LEVEL_SPACING >= Game_settings.LEVEL_SPACING]
+        self.level[level_up] += 1
+        for i in level_up:  #use math.exp, so speeds are exactly the same as in Engine
+            self.game_speed[i] = Game_settings.STARTING_SPEED * math.exp(-Game_settings.SPEED_MULTIPLIER*int(self.level[i]))
+
+        cleared = rows_cleared > 0
+        self.clear_rows(games[cleared],full[cleared])
+
+    def cells(self,shape,rotation,x,y):
+        """returns (x,y) arrays of the coords of the 4 cells of each block, in heap coords"""
+        return x[:,None] + CELLS_X[shape,rotation % ROTATIONS[shape]],y[:,None] + CELLS_Y[shape,rotation % ROTATIONS[shape]]
+
+    def collisions(self,games,x,y,rotation):
+        """
+            check the falling block of each game in games, placed at x,y in rotation
+            returns (floor,heap,boarder) boolean arrays, true where the block hits the bottom of the board,
+            the heap, or the sides of the boarder, following the rules of Game_board.check_move
+        """
+        cx,cy = self.cells(self.shape[games],rotation,x,y)
+        floor = (cy == -1).any(axis = 1)
+        inside = (cx >= 0) & (cx < Dim.BOARD_W) & (cy >= 0) & (cy < HEAP_H)
+        symbols = self.heap[games[:,None],np.clip(cy,0,HEAP_H - 1),np.clip(cx,0,Dim.BOARD_W - 1)]
+        heap = ((symbols != 0) & inside).any(axis = 1)
+        #the top row of the boarder is left open, so blocks can enter the board
+        boarder = (((cx == -1) | (cx == Dim.BOARD_W)) & (cy >= -1) & (cy < Dim.BOARD_H)).any(axis = 1)
+        return floor,heap,boarder
+
+    def move(self,games,dx):
+        floor,heap,boarder = self.collisions(games,self.x[games] + dx,self.y[games],self.rotation[games])
+        valid = ~(floor | heap | boarder)
+        self.x[games[valid]] += dx
+
+    def rotate(self,games):
+        rotation = (self.rotation[games] + 1) % ROTATIONS[self.shape[games]]
+        floor,heap,boarder = self.collisions(games,self.x[games],self.y[games],rotation)
+        valid = ~(floor | heap | boarder)
+        self.rotation[games[valid]] = rotation[valid]
+
+    def down(self,games):
+        """move blocks down one row, blocks that hit the floor or heap are added to the heap, returns which blocks moved"""
+        floor,heap,boarder = self.collisions(games,self.x[games],self.y[games] - 1,self.rotation[games])
+        land = floor | heap
+        moved = ~land & ~boarder
+        self.y[games[moved]] -= 1
+        self.add_to_heap(games[land])
+        return moved
+
+    def drop(self,games):
+        #move blocks down until there has been an invalid move
+        while games.size:
+            games = games[self.down(games)]
+
+    def add_to_heap(self,games):
+        """add the falling blocks to the heap and spawn the next blocks, games with a block at the top of the board are lost"""
+        if not games.size:
+            return
+        shape = self.shape[games]
+        cx,cy = self.cells(shape,self.rotation[games],self.x[games],self.y[games])
+        #like Game_board.add_block_to_heap, cells are added in order until one is at the top of the board
+        top = cy == Dim.BOARD_H
+        lost = top.any(axis = 1)
+        first_top = np.where(lost,top.argmax(axis = 1),cx.shape[1])
+        add = (np.arange(cx.shape[1])[None,:] < first_top[:,None]) & (cx >= 0) & (cx < Dim.BOARD_W)
+        rows = np.broadcast_to(games[:,None],cx.shape)
+        self.heap[rows[add],cy[add],cx[add]] = np.broadcast_to(SYMBOLS[shape][:,None],cx.shape)[add]
+
+        self.game_over[games[lost]] = True
+        spawned = games[~lost]
+        self.rotation[spawned] = 0
+        self.x[spawned] = SPAWN_X
+        self.y[spawned] = SPAWN_Y
+        for i in spawned:
+            self.shape[i] = self.pieces[i].next_index()
+            self.next_shape[i] = self.pieces[i].peek()[0]
+
+    def clear_rows(self,games,full):
+        """remove the full rows from the heaps of games, rows above them move down"""
+        if not games.size:
+            return
+        #a stable sort on the full flags moves full rows to the top, keeping the order of the other rows
+        order = np.argsort(full,axis = 1,kind = 'stable')
+        heap = np.take_along_axis(self.heap[games],order[:,:,None],axis = 1)
+        heap[np.take_along_axis(full,order,axis = 1)] = 0
+        self.heap[games] = heap
@@ -0,0 +1,588 @@
+"""
+this file contains benchmarks for the tetris engine
+
+to run the benchmarks:
+    python3 Benchmark.py
+
+to run the suite of hot path benchmarks, save the results as json, and compare them to an earlier run:
+    python3 Benchmark.py --suite --json new.json --compare old.json
+"""
+from Engine import Engine
+from Bot import Bot
+from Screen import Screen
+from Screen_objects import Game_board,Block_heap,Bit_block_heap
+from Shape import SHAPES,L
+from Settings import Dim,Symbols,Movement
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+#games are cut off after this many ticks, so a benchmark can never run forever
+MAX_TICKS = 10000
+
+def random_game(seed,max_ticks = MAX_TICKS):
+    """play a headless game, doing one random action before every tick, returns the finished engine"""
+    engine = Engine(seed)
+    rng = random.Random(seed)
+    while not engine.game_over and engine.ticks < max_ticks:
+        engine.step(rng.choice(Engine.ACTIONS))
+        engine.tick()
+    return engine
+
+def bench_engine(games = 200,seed = 0):
+    """play games random games, and return how many games and ticks were done per second"""
+    ticks = 0
+    start = time.perf_counter()
+    for i in range(games):
+        ticks += random_game(seed + i).ticks
+    seconds = time.perf_counter() - start
+    return {
+        'games':games,
+        'ticks':ticks,
+        'seconds':seconds,
+        'games_per_second':games / seconds,
+        'ticks_per_second':ticks / seconds}
+
+def bench_replay(games = 200,seed = 0,actions_per_tick = .25):
+    """
+        record games random games, doing a random action on actions_per_tick of the ticks,
+        then play the recordings back and return how many replays and ticks were played per second
+    """
+    from Replay import Recorder,Replay
+
+    replays = []
+    ticks = 0
+    for i in range(games):
+        engine = Engine(seed + i)
+        rng = random.Random(seed + i)
+        recording = io.BytesIO()
+        recorder = Recorder(recording,engine)
+        while not engine.game_over and engine.ticks < MAX_TICKS:
+            if rng.random() < actions_per_tick:
+                engine.step(rng.choice(Engine.ACTIONS))
+            engine.tick()
+        recorder.close()
+        ticks += engine.ticks
+        replays.append(Replay(recording.getvalue()))
+
+    start = time.perf_counter()
+    for replay in replays:
+        replay.play()
+    seconds = time.perf_counter() - start
+    return {
+        'games':games,
+        'ticks':ticks,
+        'bytes':sum(len(replay.data) for replay in replays),
+        'seconds':seconds,
+        'games_per_second':games / seconds,
+        'ticks_per_second':ticks / seconds}
+
+def bench_batch(games = 1024,steps = 200,seed = 0):
+    """step a batch of games with random actions, and return how many ticks were done per second"""
+    import numpy as np  #numpy is only needed for the batch engine
+    from Batch_engine import Batch_engine,ACTIONS
+
+    batch = Batch_engine(range(seed,seed + games))
+    rng = np.random.default_rng(seed)
+    finished = 0
+    start = time.perf_counter()
+    for i in range(steps):
+        rewards,done = batch.step(rng.integers(0,len(ACTIONS),games))
+        finished += int(done.sum())
+    seconds = time.perf_counter() - start
+    return {
+        'games':finished,
+        'ticks':games*steps,
+        'seconds':seconds,
+        'games_per_second':finished / seconds,
+        'ticks_per_second':games*steps / seconds}
+
+def bench_vector_env(games = 256,steps = 200,workers = 1,seed = 0):
+    """step a vector env of games games on workers processes with random actions, and return how many steps were done per second"""
+    import numpy as np  #numpy is only needed for the vector env
+    from Vector_env import Vector_env
+    from Batch_engine import ACTIONS
+
+    rng = np.random.default_rng(seed)
+    actions = rng.integers(0,len(ACTIONS),(steps,games))
+    with Vector_env(range(seed,seed + games),workers) as env:
+        env.reset()
+        start = time.perf_counter()
+        for i in range(steps):
+            env.step(actions[i])
+        seconds = time.perf_counter() - start
+    return {
+        'games':games,
+        'workers':workers,
+        'steps':steps,
+        'seconds':seconds,
+        'steps_per_second':steps / seconds,
+        'game_steps_per_second':games*steps / seconds}
+
+def bench_input_idle(seconds = 1):
+    """
+        wait for keys that never come for seconds, the way Game.get_input does, 
+        and return the fraction of a cpu core used while waiting
+    """
+    from Keyboard import Keyboard
+
+    read_fd,write_fd = os.pipe()    #nothing is written to the pipe, so no keys are pressed
+    active = True
+    with Keyboard(read_fd) as keyboard:
+        def get_input():
+            while active:
+                keyboard.read_keys()
+        th = threading.Thread(target = get_input)
+        start_wall,start_cpu = time.monotonic(),time.process_time()
+        th.start()
+        time.sleep(seconds)
+        active = False
+        keyboard.wake()
+        th.join()
+        wall,cpu = time.monotonic() - start_wall,time.process_time() - start_cpu
+    os.close(read_fd)
+    os.close(write_fd)
+    return {'seconds':wall,'cpu_seconds':cpu,'cpu_usage':cpu / wall}
+
+def bench_scheduler(seconds = 1,level = 15,seed = 0):
+    """
+        run a game with no input on the scheduler for seconds at level, composing frames without printing them,
+        and return how late the gravity ticks were
+    """
+    from Commands import Command_queue
+    from Scheduler import Scheduler
+
+    engine = Engine(seed)
+    engine.start_at_level(level)
+    scheduler = Scheduler(engine,Command_queue(),engine.screen.compose)
+    end = time.monotonic() + seconds
+    scheduler.run(lambda: time.monotonic() < end)
+    result = scheduler.stats()
+    result['tick_time'] = engine.game_speed
+    return result
+
+def bench_memory(games = 200,seed = 0,ticks = 50):
+    """
+        keep games live engines in memory, each played for ticks random ticks so their heaps have blocks in them,
+        and return how many bytes of memory each live game uses
+    """
+    import gc
+    import tracemalloc
+
+    rng = random.Random(seed)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    engines = []
+    for i in range(games):
+        engine = Engine(seed + i)
+        for tick in range(ticks):
+            engine.step(rng.choice(Engine.ACTIONS))
+            engine.tick()
+        engine.screen.compose()     #games being shown have a composed frame
+        engines.append(engine)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {'games':games,'bytes':used,'bytes_per_game':used / games}
+
+#keys the simulated server clients press
+CLIENT_KEYS = [b'a',b'd',b'w',b'\x1b[D',b'\x1b[C']
+
+async def server_clients(port,sessions,seconds,seed):
+    """
+        connect sessions telnet clients to the server on port, each pressing a random key every few tenths of a second
+        until seconds have passed, returns the number of bytes the clients received
+    """
+    import asyncio
+
+    rng = random.Random(seed)
+    received = [0]
+    end = time.monotonic() + seconds
+
+    async def client():
+        #players dont all connect at the same moment, so their gravity ticks arent all due at once
+        await asyncio.sleep(rng.uniform(0,1))
+        reader,writer = await asyncio.open_connection('localhost',port)
+        async def read():
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                received[0] += len(data)
+        reading = asyncio.ensure_future(read())
+        writer.write(b'p')
+        while time.monotonic() < end and not reading.done():
+            await asyncio.sleep(rng.uniform(.1,.5))
+            writer.write(rng.choice(CLIENT_KEYS))
+        writer.close()
+        await reading
+
+    await asyncio.gather(*[client() for i in range(sessions)])
+    return received[0]
+
+def run_server_clients(port,sessions,seconds,seed,results):
+    """run server_clients in a process of its own, putting the bytes received in the results queue"""
+    import asyncio
+    results.put(asyncio.run(server_clients(port,sessions,seconds,seed)))
+
+def bench_server(sessions = 300,seconds = 5,level = 0,seed = 0):
+    """
+        run the game server for seconds, with sessions clients from server_clients connected to it,
+        and return how late the sessions gravity ticks were and how much of a core the server used
+        the clients run in their own process, so they dont share the servers event loop
+    """
+    import asyncio
+    import multiprocessing
+    from Server import Server
+
+    async def run():
+        server = Server(level)
+        port = await server.start('localhost',0)
+        results = multiprocessing.Queue()
+        clients = multiprocessing.Process(target = run_server_clients,args = (port,sessions,seconds,seed,results))
+        start_wall,start_cpu = time.monotonic(),time.process_time()
+        clients.start()
+        while clients.is_alive() and results.empty():
+            await asyncio.sleep(.1)
+        received = results.get()
+        clients.join()
+        wall,cpu = time.monotonic() - start_wall,time.process_time() - start_cpu
+        result = server.stats()
+        await server.stop()
+        result.update({'sessions':sessions,'seconds':wall,'cpu_usage':cpu / wall,'ticks':server.wheel.fired,
+                       'bytes_per_session_per_second':received / sessions / wall})
+        return result
+    return asyncio.run(run())
+
+def bench_broadcast(viewers = 20,seed = 0,max_ticks = 2000):
+    """
+        play a random game, publishing a frame after every action and every tick to viewers spectators,
+        and return how long each publish took and how many bytes each spectator was sent per second of game time
+        the spectators are read after each publish, outside of the timed part
+    """
+    import socket
+    from Broadcast import Publisher
+
+    publisher = Publisher()
+    spectators = [socket.create_connection(('localhost',publisher.port)) for i in range(viewers)]
+    for spectator in spectators:
+        spectator.setblocking(False)
+
+    def drain():
+        for spectator in spectators:
+            try:
+                while spectator.recv(65536):
+                    continue
+            except BlockingIOError:
+                pass
+
+    engine = Engine(seed)
+    rng = random.Random(seed)
+    seconds = game_time = 0
+    frames = 0
+    while not engine.game_over and engine.ticks < max_ticks:
+        for step in (lambda: engine.step(rng.choice(Engine.ACTIONS)),engine.tick):
+            step()
+            frame = engine.screen.compose()
+            start = time.perf_counter()
+            publisher.publish(frame)
+            seconds += time.perf_counter() - start
+            frames += 1
+            drain()
+        game_time += engine.game_speed
+    stats = publisher.stats()
+    publisher.close()
+    for spectator in spectators:
+        spectator.close()
+    sent = [subscriber['bytes_sent'] for subscriber in stats['subscribers']]
+    return {
+        'viewers':viewers,
+        'frames':frames,
+        'game_time':game_time,
+        'publish_time':seconds / frames,
+        'bytes_per_frame':statistics.mean(sent) / frames,
+        'bytes_per_second':statistics.mean(sent) / game_time,
+        'dropped_frames':sum(subscriber['dropped_frames'] for subscriber in stats['subscribers'])}
+
+#heap fill levels and board sizes the suite is run at
+FILL_LEVELS = (0,.25,.5,.75)
+BOARD_SIZES = ((10,20),(20,40))
+
+#a benchmark that got this much slower than in the compared run is reported as a regression
+REGRESSION_THRESHOLD = 1.1
+
+def measure(fn,setup = None,number = 1000,repeat = 5,warmup = 100):
+    """
+        time fn, returning statistics of the seconds one call takes over repeat runs of number calls
+        setup is called before every call to fn and is not timed, it is used to reset state fn changes
+    """
+    def run(count):
+        if setup is None:
+            start = time.perf_counter()
+            for i in range(count):
+                fn()
+            return time.perf_counter() - start
+        total = 0
+        for i in range(count):
+            setup()
+            start = time.perf_counter()
+            fn()
+            total += time.perf_counter() - start
+        return total
+
+    run(warmup)
+    times = [run(number) / number for i in range(repeat)]
+    return {
+        'min':min(times),
+        'mean':statistics.mean(times),
+        'median':statistics.median(times),
+        'stdev':statistics.stdev(times) if repeat > 1 else 0,
+        'number':number,
+        'repeat':repeat}
+
+def fill_heap(heap,width,height,fill,rng,full_rows = 0):
+    """
+        fill the bottom fill fraction of the heaps rows with random blocks, leaving a gap in each row,
+        then make full_rows of those rows full
+    """
+    rows = int(height*fill)
+    gaps = []
+    for y in range(rows):
+        gaps.append(rng.randrange(width))
+        for x in range(width):
+            if x != gaps[y] and (y < full_rows or rng.random() < .7):
+                heap[[x + heap.location[0],y + heap.location[1]]] = Symbols.SQUARE
+    for y in range(min(full_rows,rows)):
+        heap[[gaps[y] + heap.location[0],y + heap.location[1]]] = Symbols.SQUARE
+
+def copy_heap(heap):
+    """returns a function that puts heap back to the state it is in now"""
+    heights,row_counts,zobrist = heap.heights[:],heap.row_counts[:],heap.zobrist
+    if isinstance(heap,Bit_block_heap):
+        rows,symbols = heap.rows[:],[row[:] for row in heap.symbols]
+        def restore_rows():
+            heap.rows = rows[:]
+            heap.symbols = [row[:] for row in symbols]
+    else:
+        block_heap = [row[:] for row in heap.block_heap]
+        def restore_rows():
+            heap.block_heap = [row[:] for row in block_heap]
+    def restore():
+        restore_rows()
+        heap.heights = heights[:]
+        heap.row_counts = row_counts[:]
+        heap.zobrist = zobrist
+        heap.version += 1
+    return restore
+
+def board_at(width,height,fill,heap_type = Bit_block_heap,seed = 0):
+    board = Game_board(L(),height,width,[1,1],Symbols.BOARDER,heap_type)
+    fill_heap(board.block_heap,width,height,fill,random.Random(seed))
+    return board
+
+def screen_at(fill,seed = 0):
+    screen = Screen(seed = seed)
+    fill_heap(screen.game_board.block_heap,Dim.BOARD_W,Dim.BOARD_H,fill,random.Random(seed))
+    return screen
+
+def suite(quick = False):
+    """run every hot path benchmark, returns a dict of {benchmark name:timing statistics}"""
+    scale = .1 if quick else 1
+    def n(number):
+        return max(int(number*scale),10)
+    results = {}
+
+    shape = L()
+    results['shape_rotate'] = measure(shape.rotate,number = n(100000))
+
+    for fill in FILL_LEVELS:
+        tag = '[fill={}]'.format(fill)
+        screen = screen_at(fill)
+        results['screen_compose' + tag] = measure(screen.compose,number = n(2000))
+
+        screen.renderer.stream = io.StringIO()
+        moves = iter(range(10**9))
+        def move():    #move the block back and forth, so every frame has something to write
+            screen.game_board.block.location[0] = 3 + next(moves) % 4
+            screen.renderer.stream.seek(0)
+            screen.renderer.stream.truncate()
+        results['screen_print' + tag] = measure(screen.print,move,number = n(2000))
+
+        cells = [(x,y) for y in range(Dim.SCREEN_H + 1) for x in range(Dim.SCREEN_W)]
+        def getitem_all():
+            for coord in cells:
+                screen[coord]
+        results['screen_getitem_all_cells' + tag] = measure(getitem_all,number = n(20),warmup = 2)
+
+        directions = iter([Movement.LEFT,Movement.RIGHT]*10**6)
+        results['screen_move_block' + tag] = measure(lambda: screen.move_block(next(directions)),number = n(20000))
+
+        restore = copy_heap(screen.game_board.block_heap)
+        def new_block():
+            restore()
+            screen.game_board.block = screen.next_block.block
+        results['screen_drop_block' + tag] = measure(screen.drop_block,new_block,number = n(2000))
+
+    for width,height in BOARD_SIZES:
+        for fill in FILL_LEVELS:
+            tag = '[{}x{},fill={}]'.format(width,height,fill)
+            board = board_at(width,height,fill)
+            #place the block just above the heap, the most common place for a move to be checked
+            board.block.location[1] = int(height*fill) + 3
+            def check_move():
+                try:
+                    board.check_move(Movement.DOWN)
+                except (Game_board.InvalidMove,Game_board.AddToHeap):
+                    pass
+            results['check_move' + tag] = measure(check_move,number = n(20000))
+            shape = board.block.shape
+            x,y = board.block.location
+            results['test_placement' + tag] = measure(lambda: board.test_placement(shape,shape.rotation,x,y - 1),number = n(20000))
+            board.block.location[1] = height + 2
+            results['landing' + tag] = measure(board.landing,number = n(20000))
+
+            for heap_type in (Block_heap,Bit_block_heap):
+                heap_tag = '[{},{}x{},fill={}]'.format(heap_type.__name__,width,height,fill)
+                heap = heap_type(width,[1,1])
+                fill_heap(heap,width,height,fill,random.Random(0),full_rows = 4)
+                results['get_full_rows' + heap_tag] = measure(heap.get_full_rows,number = n(20000))
+                full_rows = heap.get_full_rows()
+                results['adjust_rows' + heap_tag] = measure(lambda: heap.adjust_rows(full_rows),copy_heap(heap),number = n(5000))
+
+    for fill in FILL_LEVELS:
+        tag = '[fill={}]'.format(fill)
+        engine = Engine(0)
+        fill_heap(engine.screen.game_board.block_heap,Dim.BOARD_W,Dim.BOARD_H,fill,random.Random(0))
+        snapshot = engine.snapshot()
+        results['snapshot' + tag] = measure(engine.snapshot,number = n(20000))
+        results['restore' + tag] = measure(lambda: engine.restore(snapshot),number = n(20000))
+        results['from_snapshot' + tag] = measure(lambda: Engine.from_snapshot(snapshot),number = n(2000))
+        #without a transposition table every search is done in full, with one the searches after the first are cached
+        bot = Bot(table_size = 0)
+        results['bot_best_placement' + tag] = measure(lambda: bot.best_placement(engine),number = n(200),warmup = 10)
+        bot = Bot()
+        results['bot_best_placement_cached' + tag] = measure(lambda: bot.best_placement(engine),number = n(200),warmup = 10)
+
+    games = bench_engine(n(100))
+    results['game'] = {
+        'min':games['seconds'] / games['games'],
+        'mean':games['seconds'] / games['games'],
+        'median':games['seconds'] / games['games'],
+        'stdev':0,
+        'number':games['games'],
+        'repeat':1,
+        'ticks_per_second':games['ticks_per_second']}
+    return results
+
+def run_info():
+    """information about the run, saved with the results so runs can be told apart"""
+    try:
+        commit = subprocess.run(['git','rev-parse','HEAD'],capture_output = True,text = True,
+                                cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit':commit,'python':platform.python_version(),'platform':platform.platform(),'time':time.time()}
+
+def compare(results,baseline):
+    """print how each benchmark changed from baseline, returns the names of benchmarks that got slower"""
+    regressions = []
+    for name,result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['median'] / baseline[name]['median']
+        flag = ''
+        if ratio > REGRESSION_THRESHOLD:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('{:60} {:>12.3f}us {:>7.2f}x{}'.format(name,result['median']*1e6,ratio,flag))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'benchmark the headless tetris engine')
+    parser.add_argument('--games',type = int,default = 200)
+    parser.add_argument('--seed',type = int,default = 0)
+    parser.add_argument('--batch',type = int,default = 0,help = 'benchmark the numpy batch engine with this many games instead')
+    parser.add_argument('--vector',type = int,default = 0,
+                        help = 'benchmark the vector env with this many games, on 1,2,4... worker processes up to one per cpu core')
+    parser.add_argument('--idle',action = 'store_true',help = 'measure cpu usage of the input thread while no keys are pressed')
+    parser.add_argument('--jitter',action = 'store_true',help = 'measure how late gravity ticks are at a high level')
+    parser.add_argument('--replay',action = 'store_true',help = 'record random games, and measure how fast they are played back')
+    parser.add_argument('--memory',action = 'store_true',help = 'measure the memory used by each live game')
+    parser.add_argument('--server',type = int,default = 0,help = 'measure tick lag of the game server with this many clients connected')
+    parser.add_argument('--broadcast',type = int,default = 0,help = 'measure the cost of broadcasting a game to this many spectators')
+    parser.add_argument('--suite',action = 'store_true',help = 'run the suite of hot path benchmarks')
+    parser.add_argument('--quick',action = 'store_true',help = 'run the suite with fewer iterations')
+    parser.add_argument('--json',help = 'file to save the suite results to, - for stdout')
+    parser.add_argument('--compare',help = 'json file of an earlier suite run to compare against')
+    args = parser.parse_args()
+
+    if args.suite:
+        results = suite(args.quick)
+        if args.json == '-':
+            json.dump({'info':run_info(),'results':results},sys.stdout,indent = 1)
+        elif args.json:
+            with open(args.json,'w') as f:
+                json.dump({'info':run_info(),'results':results},f,indent = 1)
+        if args.compare:
+            with open(args.compare) as f:
+                regressions = compare(results,json.load(f)['results'])
+            raise SystemExit(1 if regressions else 0)
+        if args.json != '-':
+            for name,result in results.items():
+                print('{:60} {:>12.3f}us'.format(name,result['median']*1e6))
+        raise SystemExit
+    if args.jitter:
+        result = bench_scheduler()
+        print('{ticks} ticks of {tick_time:.4f}s, {frames} frames'.format(**result))
+        print('tick jitter: max {max_jitter:.6f}s, p99 {p99_jitter:.6f}s, average {average_jitter:.6f}s'.format(**result))
+        raise SystemExit
+    if args.replay:
+        result = bench_replay(args.games,args.seed)
+        print('{games} replays, {ticks} ticks, {bytes} bytes, played in {seconds:.3f}s'.format(**result))
+        print('{games_per_second:.1f} replays/s, {ticks_per_second:.1f} ticks/s'.format(**result))
+        raise SystemExit
+    if args.memory:
+        result = bench_memory(args.games,args.seed)
+        print('{games} live games use {bytes} bytes, {bytes_per_game:.0f} bytes per game'.format(**result))
+        raise SystemExit
+    if args.server:
+        result = bench_server(args.server,seed = args.seed)
+        print('{sessions} sessions for {seconds:.2f}s, the server used {cpu_usage:.1%} of a core, {ticks} timers fired, '
+              '{bytes_per_session_per_second:.0f} bytes/s sent to each session'.format(**result))
+        print('tick lag: p99 {p99_lag:.4f}s, average {average_lag:.4f}s, max {max_lag:.4f}s'.format(**result))
+        raise SystemExit
+    if args.broadcast:
+        result = bench_broadcast(args.broadcast,args.seed)
+        print('{frames} frames sent to {viewers} spectators, {publish_time:.6f}s to publish each frame, '
+              '{dropped_frames} frames dropped'.format(**result))
+        print('{bytes_per_frame:.1f} bytes per frame, {bytes_per_second:.0f} bytes/s of game time to each spectator'.format(**result))
+        raise SystemExit
+    if args.vector:
+        workers = 1
+        while True:
+            result = bench_vector_env(args.vector,workers = workers,seed = args.seed)
+            print('{workers} workers: {steps_per_second:.1f} steps/s, {game_steps_per_second:.0f} game steps/s'.format(**result))
+            if workers >= (os.cpu_count() or 1):
+                break
+            workers = min(workers*2,os.cpu_count())
+        raise SystemExit
+    if args.idle:
+        result = bench_input_idle()
+        print('input thread used {cpu_seconds:.4f}s of cpu in {seconds:.3f}s ({cpu_usage:.2%} of a core)'.format(**result))
+        raise SystemExit
+    if args.batch:
+        result = bench_batch(args.batch,seed = args.seed)
+    else:
+        result = bench_engine(args.games,args.seed)
+    print('{games} games, {ticks} ticks in {seconds:.3f}s'.format(**result))
+    print('{games_per_second:.1f} games/s, {ticks_per_second:.1f} ticks/s'.format(**result))
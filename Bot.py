@@ -0,0 +1,419 @@
+"""
+this file contains the autoplayer, which picks where to drop each falling block and plays the moves to get it there
+
+a placement is a rotation and column the falling block is dropped in, placements are searched without
+moving the block or changing the games heap
+for every shape, rotation and column a footprint is built once, holding the columns the shape covers and its row masks,
+so finding where a placement lands and scoring the heap after it only looks at the columns the shape covers
+
+the heap is scored with the weights in Settings.Autoplay, from its holes, column heights, bumpiness,
+and the Scoring.POINTS of the rows cleared
+with lookahead the piece in the next block box is placed after each placement of the falling block,
+and the falling block is dropped where the best heap after both is reached
+
+the same heap is often reached by different placements, heaps are told apart by their zobrist hash,
+and the best score for placing a piece on a heap is kept in a size bounded transposition table
+
+to play headless games with the autoplayer and print their scores:
+    python3 Bot.py --games 10
+"""
+from Engine import Engine
+from Shape import SHAPES
+from Screen_objects import zobrist_hash,zobrist_row
+from Settings import Autoplay,Game_settings,Scoring,Movement
+
+import argparse
+import collections
+import functools
+import time
+
+#returned by Transposition_table.get when nothing is stored for a key, since None is a result that can be stored
+MISSING = object()
+
+
+class Footprint():
+    """
+    The footprint class describes a shape in one rotation, with its origin in one column of a heap
+
+    a footprint is described by the following
+        rotation: index of the rotation in the shapes ROTATIONS
+        x: heap column the shapes origin is in
+        columns: tuple of (heap column,lowest y,highest y) for each column the shape covers
+        masks: tuple of (y,mask) for each row the shape covers, with the mask shifted to the heap columns
+        left,right: the first and last heap column the shape covers
+        floor: lowest y the origin can be at, where the shape is on the bottom of the heap
+        top: highest y of the shape
+        size: number of cells in the shape
+    """
+
+    __slots__ = ('rotation','x','columns','masks','left','right','floor','top','size')
+
+    def __init__(self,rotation,index,x):
+        self.rotation = index
+        self.x = x
+        tops = {}
+        for dx,dy in rotation.coords:
+            tops[dx] = max(tops.get(dx,dy),dy)
+        self.columns = tuple((x + dx,bottom,tops[dx]) for dx,bottom in rotation.column_bottoms)
+        self.masks = tuple((dy,mask << x + rotation.left) for dy,mask in rotation.masks)
+        self.left = x + rotation.left
+        self.right = x + rotation.right
+        self.floor = -rotation.bottom
+        self.top = rotation.top
+        self.size = len(rotation.coords)
+
+@functools.lru_cache(maxsize = None)
+def footprints(shape_type,width):
+    """
+        returns the footprints of shape_type on a heap width columns wide,
+        as a tuple of {heap column:footprint} dicts, one for each rotation
+        only columns where the whole shape is on the heap are included
+    """
+    table = []
+    for index,rotation in enumerate(shape_type.ROTATIONS):
+        table.append({x:Footprint(rotation,index,x) for x in range(-rotation.left,width - rotation.right)})
+    return tuple(table)
+
+def column_heights(rows,width):
+    """returns the height of each column of a heap of row masks"""
+    heights = [0]*width
+    for y,row in enumerate(rows):
+        while row:  #loop through only the set bits
+            bit = row & -row
+            heights[bit.bit_length() - 1] = y + 1
+            row ^= bit
+    return heights
+
+
+class Search_heap():
+    """
+    The search heap class is a copy of a heaps rows, that placements are tried on without changing the games heap
+
+    full rows are removed as soon as a block is placed, the way they are at the end of the games tick,
+    and full rows in the heap being copied are left out, since they are removed before the next block lands
+
+    a search heap is described by the following
+        width,height: the boards diminsions, a block placed with any cell above height loses the game
+        rows: list of row masks, bit x is set if there is a block in column x
+        heights: height of each column
+        aggregate: sum of the column heights
+        cells: number of blocks in the heap
+        bumpiness: sum of the height differences between neighboring columns
+        zobrist: hash of the cells with a block in them, the same as the hash of a Block_heap with the same blocks
+    """
+
+    __slots__ = ('width','height','full_mask','rows','heights','aggregate','cells','bumpiness','zobrist')
+
+    def __init__(self,width,height,rows = (),zobrist = None):
+        """zobrist is the hash of rows, it is found from the rows if it isnt given or any full rows are left out"""
+        self.width = width
+        self.height = height
+        self.full_mask = (1 << width) - 1
+        self.rows = [row for row in rows if row != self.full_mask]
+        if zobrist is None or len(self.rows) != len(rows):
+            zobrist = zobrist_hash(self.rows)
+        self.zobrist = zobrist
+        while self.rows and not self.rows[-1]:
+            self.rows.pop()
+        self.heights = column_heights(self.rows,width)
+        self.aggregate = sum(self.heights)
+        self.cells = sum(bin(row).count('1') for row in self.rows)
+        self.bumpiness = sum(abs(self.heights[x] - self.heights[x + 1]) for x in range(width - 1))
+
+    @classmethod
+    def from_heap(cls,heap,height):
+        """copy a Block_heap or Bit_block_heap, on a board height rows high"""
+        return cls(heap.width,height,heap.row_masks(),heap.zobrist)
+
+    @property
+    def holes(self):
+        """empty cells with a block above them"""
+        return self.aggregate - self.cells
+
+    def fits(self,rotation,x,y):
+        """returns true if a shape in rotation, with its origin at [x,y] on the heap, is inside the walls and above every column it covers"""
+        if y + rotation.bottom < 0:
+            return False
+        heights = self.heights
+        for dx,bottom in rotation.column_bottoms:
+            if not 0 <= x + dx < self.width or y + bottom < heights[x + dx]:
+                return False
+        return True
+
+    def placements(self,shape_type,rotation,x,y):
+        """
+            yields (footprint,turns,shift) for every placement a shape_type in rotation index rotation,
+            with its origin at [x,y] on the heap, can reach by turning turns times where it is,
+            then moving shift columns to the right (or left if shift is negative)
+
+            the shape has to be above the heap the whole way, so only the columns the shape covers are looked at
+        """
+        rotations = shape_type.ROTATIONS
+        table = footprints(shape_type,self.width)
+        for turns in range(len(rotations)):
+            index = (rotation + turns) % len(rotations)
+            if not self.fits(rotations[index],x,y):     #the shape cant be turned any further
+                return
+            yield table[index][x],turns,0
+            for step in (-1,1):
+                column = x + step
+                while column in table[index] and self.fits(rotations[index],column,y):
+                    yield table[index][column],turns,column - x
+                    column += step
+
+    def landing(self,footprint):
+        """returns the y the origin of footprint lands at when it is dropped"""
+        heights = self.heights
+        y = footprint.floor
+        for column,bottom,top in footprint.columns:
+            if heights[column] - bottom > y:
+                y = heights[column] - bottom
+        return y
+
+    def score(self,weights):
+        return weights.HEIGHT*self.aggregate + weights.HOLES*self.holes + weights.BUMPINESS*self.bumpiness
+
+    def evaluate(self,footprint,weights):
+        """
+            returns the score of the heap after footprint is dropped on it, None if dropping it loses the game
+
+            the heap isnt copied, the score is found from the change to the columns the shape covers,
+            only placements that clear rows are placed on a copy of the heap
+        """
+        y = self.landing(footprint)
+        if y + footprint.top >= self.height:
+            return None
+        rows = self.rows
+        height = len(rows)
+        lines = 0
+        for dy,mask in footprint.masks:
+            if y + dy < height and rows[y + dy] | mask == self.full_mask:
+                lines += 1
+        if lines:
+            heap,lines = self.place(footprint,y)
+            return heap.score(weights) + weights.LINES*Scoring.POINTS[lines]
+
+        heights = self.heights
+        new_heights = heights[:]
+        aggregate = self.aggregate
+        for column,bottom,top in footprint.columns:
+            #the shape lands above every column it covers, so its top is the new top of the column
+            new_heights[column] = y + top + 1
+            aggregate += y + top + 1 - heights[column]
+        #only the differences next to the columns the shape covers change
+        bumpiness = self.bumpiness
+        for x in range(max(footprint.left - 1,0),min(footprint.right + 1,self.width - 1)):
+            bumpiness += abs(new_heights[x] - new_heights[x + 1]) - abs(heights[x] - heights[x + 1])
+        holes = aggregate - self.cells - footprint.size
+        return weights.HEIGHT*aggregate + weights.HOLES*holes + weights.BUMPINESS*bumpiness
+
+    def place(self,footprint,y = None):
+        """
+            returns (heap,lines), a new heap with footprint dropped on it and any full rows removed,
+            and the number of rows removed
+            heap is None if dropping footprint loses the game
+        """
+        if y is None:
+            y = self.landing(footprint)
+        if y + footprint.top >= self.height:
+            return None,0
+        rows = self.rows[:]
+        zobrist = self.zobrist
+        for dy,mask in footprint.masks:
+            while y + dy >= len(rows):
+                rows.append(0)
+            rows[y + dy] |= mask
+            zobrist ^= zobrist_row(y + dy,mask)
+        heap = Search_heap(self.width,self.height,rows,zobrist)
+        return heap,len(rows) - len(heap.rows)
+
+
+class Transposition_table():
+    """
+    The transposition table class is a size bounded cache of search results,
+    when it is full the result that was used longest ago is evicted
+
+    results are stored under (heap hash,piece,start) keys, the best score for placing piece on the heap,
+        moving it from the heap coord start, since start decides which placements the piece can reach
+
+    a transposition table keeps the following counters, used to tune its size
+        hits,misses: lookups that did and didnt find a result
+        evictions: results evicted to make room for new ones
+    """
+
+    def __init__(self,size = Autoplay.TABLE_SIZE):
+        self.size = size
+        self._results = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    def get(self,key):
+        """returns the result stored under key, or MISSING if there isnt one"""
+        result = self._results.get(key,MISSING)
+        if result is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._results.move_to_end(key)
+        return result
+
+    def put(self,key,result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        if len(self._results) > self.size:
+            self._results.popitem(last = False)
+            self.evictions += 1
+
+    def clear(self):
+        self._results.clear()
+
+    def stats(self):
+        return {
+            'size':len(self),
+            'hits':self.hits,
+            'misses':self.misses,
+            'evictions':self.evictions,
+            'hit_rate':self.hit_rate}
+
+
+class Bot():
+    """
+    The bot class picks placements for an engines falling block, and plays them
+
+    a bot is described by the following
+        weights: object with the weights in Settings.Autoplay, used to score heaps
+        lookahead: true if the next piece is placed after each placement, before picking one
+        evaluated: number of placements scored
+        table: Transposition_table of the best score for placing a piece on a heap, None to not cache them
+    """
+
+    def __init__(self,weights = Autoplay,lookahead = Autoplay.LOOKAHEAD,table_size = Autoplay.TABLE_SIZE):
+        self.weights = weights
+        self.lookahead = lookahead
+        self.evaluated = 0
+        self.table = Transposition_table(table_size) if table_size else None
+
+    def best_placement(self,engine):
+        """
+            returns the best (footprint,turns,shift) placement for the engines falling block,
+            None if the block cant be moved to any placement, when it is already under the top of the heap
+        """
+        board = engine.screen.game_board
+        heap = Search_heap.from_heap(board.block_heap,board.height)
+        left,bottom = board.block_heap.location
+        block = board.block
+        x,y = block.location[0] - left,block.location[1] - bottom
+        if not self.lookahead:
+            return self.search(heap,type(block.shape),block.shape.rotation,x,y)
+        start = board.block_start_location
+        return self.search(heap,type(block.shape),block.shape.rotation,x,y,
+                           type(engine.screen.next_block.block.shape),(start[0] - left,start[1] - bottom))
+
+    def search(self,heap,shape_type,rotation,x,y,next_type = None,start = None):
+        """
+            returns the best (footprint,turns,shift) placement for shape_type in rotation index rotation,
+            with its origin at [x,y] on heap, None if it has none
+            if next_type is given, each placement is scored by the best placement of next_type after it,
+            starting from the heap coord start
+        """
+        weights = self.weights
+        best = None
+        best_value = None
+        for placement in heap.placements(shape_type,rotation,x,y):
+            self.evaluated += 1
+            if next_type is None:
+                value = heap.evaluate(placement[0],weights)
+            else:
+                value = None
+                after,lines = heap.place(placement[0])
+                if after is not None:
+                    value = self.best_value(after,next_type,start)
+                    if value is not None:
+                        value += weights.LINES*Scoring.POINTS[lines]
+            if best is None or (value is not None and (best_value is None or value > best_value)):
+                best = placement
+                best_value = value
+        return best
+
+    def best_value(self,heap,shape_type,start):
+        """
+            returns the best score of placing shape_type on heap, starting from the heap coord start, None if it has no placement
+            the score only depends on the heap, the piece and where it starts, so it is cached under (heap hash,piece,start)
+        """
+        key = (heap.zobrist,shape_type,start)
+        if self.table is not None:
+            value = self.table.get(key)
+            if value is not MISSING:
+                return value
+        value = None
+        for footprint,turns,shift in heap.placements(shape_type,0,*start):
+            self.evaluated += 1
+            next_value = heap.evaluate(footprint,self.weights)
+            if next_value is not None and (value is None or next_value > value):
+                value = next_value
+        if self.table is not None:
+            self.table.put(key,value)
+        return value
+
+    def plan(self,engine):
+        """returns the actions that move the engines falling block to its best placement and drop it"""
+        placement = self.best_placement(engine)
+        if placement is None:
+            return [Movement.DROP]
+        footprint,turns,shift = placement
+        return [Movement.ROTATE]*turns + [Movement.RIGHT if shift > 0 else Movement.LEFT]*abs(shift) + [Movement.DROP]
+
+    def play(self,engine):
+        """place the engines falling block, returns the actions done"""
+        actions = self.plan(engine)
+        for action in actions:
+            engine.step(action)
+        return actions
+
+
+def play_game(seed,bot = None,max_pieces = None,piece_mode = Game_settings.PIECE_MODE):
+    """
+        play a headless game with bot placing every block, a block is placed before every gravity tick
+        returns (engine,pieces placed,game time), where game time is how long the ticks would take at the games speed
+    """
+    bot = bot or Bot()
+    engine = Engine(seed,piece_mode)
+    pieces = 0
+    game_time = 0
+    while not engine.game_over and (max_pieces is None or pieces < max_pieces):
+        bot.play(engine)
+        game_time += engine.game_speed
+        engine.tick()
+        pieces += 1
+    return engine,pieces,game_time
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'play headless tetris games with the autoplayer')
+    parser.add_argument('--games',type = int,default = 1)
+    parser.add_argument('--seed',type = int,default = 0)
+    parser.add_argument('--pieces',type = int,default = 1000,help = 'stop each game after this many pieces')
+    parser.add_argument('--no-lookahead',action = 'store_true',help = 'only place the falling block')
+    parser.add_argument('--table',type = int,default = Autoplay.TABLE_SIZE,help = 'size of the transposition table, 0 for none')
+    args = parser.parse_args()
+
+    bot = Bot(lookahead = not args.no_lookahead,table_size = args.table)
+    start = time.perf_counter()
+    for i in range(args.games):
+        engine,pieces,game_time = play_game(args.seed + i,bot,args.pieces)
+        print('seed {}: score {}, level {}, lines {}, {} pieces{}'.format(args.seed + i,engine.score,engine.level,
+              engine.total_lines_cleared,pieces,', game over' if engine.game_over else ''))
+    seconds = time.perf_counter() - start
+    print('{} placements scored in {:.3f}s, {:.0f} placements/s'.format(bot.evaluated,seconds,bot.evaluated / seconds))
+    if bot.table is not None:
+        print('transposition table: {size} results, {hits} hits, {misses} misses, {evictions} evictions, {hit_rate:.1%} hit rate'.format(
+              **bot.table.stats()))
@@ -0,0 +1,307 @@
+"""
+this file contains the classes used to let spectators watch a game live over a local socket
+
+the game being watched has a publisher, which turns each frame into a delta holding only the cells
+that changed since the last frame (the falling block, the heap, the score and level text, ...),
+encodes it once, and sends the same bytes to every spectator watching the game
+
+spectators that join late are sent a keyframe holding every cell, and keyframes are sent to everyone
+every keyframe interval, a spectator that hasnt read the frames it was sent yet is skipped instead of
+waiting for it, and is sent a keyframe once it catches up, so a slow spectator never holds the game up
+
+messages are laid out as follows
+    header: the length of the rest of the message, KEYFRAME or DELTA, the frame number, and the frames width and height
+    keyframe: width*height symbols, one byte each, from the bottom row up
+    delta: runs of changed cells, each a RUN of (y,x,number of cells) followed by the symbols of the cells
+
+to play a game that can be watched, and watch it from another terminal:
+    python3 tetris.py --broadcast 2424
+    python3 Broadcast.py --port 2424
+"""
+from Frame import Frame
+from Renderer import Renderer
+
+import argparse
+import socket
+import struct
+import time
+
+#message types
+KEYFRAME = 1
+DELTA = 2
+
+HEADER = struct.Struct('<IBIBB')
+LENGTH = struct.Struct('<I')
+RUN = struct.Struct('<BBB')
+
+#seconds between keyframes sent to every spectator
+KEYFRAME_INTERVAL = 2
+
+def encode_keyframe(frame,number):
+    symbols = b''.join(''.join(symbol or ' ' for symbol in row).encode() for row in frame.rows)
+    return HEADER.pack(HEADER.size - LENGTH.size + len(symbols),KEYFRAME,number,frame.width,frame.height) + symbols
+
+def encode_delta(frame,last_rows,number):
+    """returns a delta of the cells in frame that are different in last_rows, None if nothing changed"""
+    runs = []
+    for y,row in enumerate(frame.rows):
+        last_row = last_rows[y]
+        if row == last_row:
+            continue
+        x = 0
+        while x < frame.width:
+            if row[x] == last_row[x]:
+                x += 1
+                continue
+            #runs of changed cells are sent together, so each cell is one byte plus a share of the run header
+            start = x
+            while x < frame.width and row[x] != last_row[x] and x - start < 255:
+                x += 1
+            runs.append(RUN.pack(y,start,x - start) + ''.join(symbol or ' ' for symbol in row[start:x]).encode())
+    if not runs:
+        return None
+    body = b''.join(runs)
+    return HEADER.pack(HEADER.size - LENGTH.size + len(body),DELTA,number,frame.width,frame.height) + body
+
+
+class Subscriber():
+    """
+    The subscriber class is one spectators connection to a publisher
+
+    a subscriber is described by the following
+        sock: the spectators non blocking socket
+        connected: time the spectator joined
+        bytes_sent,frames_sent: bytes and frames sent to the spectator
+        dropped_frames: frames skipped because the spectator hadnt read the earlier ones yet
+        stale: true if the spectator needs a keyframe before it can be sent deltas
+        closed: true once the spectator has gone
+        disconnected: time the spectator left, None while it is watching
+    """
+
+    def __init__(self,sock):
+        self.sock = sock
+        self.connected = time.monotonic()
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.dropped_frames = 0
+        self.stale = True
+        self.closed = False
+        self.disconnected = None
+        self._pending = bytearray()     #bytes the socket wouldnt take yet
+
+    @property
+    def behind(self):
+        return bool(self._pending)
+
+    @property
+    def seconds(self):
+        return (self.disconnected or time.monotonic()) - self.connected
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes_sent / max(self.seconds,1e-9)
+
+    def send(self,message):
+        self._pending += message
+        self.frames_sent += 1
+        self.flush()
+
+    def flush(self):
+        """send as much of the waiting bytes as the socket will take, without blocking"""
+        if not self._pending or self.closed:
+            return
+        try:
+            sent = self.sock.send(self._pending)
+        except BlockingIOError:
+            return
+        except OSError:     #the spectator has gone
+            self.close()
+            return
+        del self._pending[:sent]
+        self.bytes_sent += sent
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.disconnected = time.monotonic()
+        self.sock.close()
+
+    def stats(self):
+        return {
+            'seconds':self.seconds,
+            'bytes_sent':self.bytes_sent,
+            'frames_sent':self.frames_sent,
+            'dropped_frames':self.dropped_frames,
+            'bytes_per_second':self.bytes_per_second}
+
+
+class Publisher():
+    """
+    The publisher class sends a games frames to every spectator connected to it
+
+    publish() is called by the game loop after each frame is drawn, it accepts new spectators,
+    and sends the frame without ever waiting on a socket
+
+    a publisher is described by the following
+        port: port spectators connect to
+        keyframe_interval: seconds between keyframes sent to every spectator
+        subscribers: every spectator that has joined, including the ones that have left
+        frames: number of frames published
+    """
+
+    def __init__(self,port = 0,host = 'localhost',keyframe_interval = KEYFRAME_INTERVAL):
+        self.listener = socket.create_server((host,port))
+        self.listener.setblocking(False)
+        self.port = self.listener.getsockname()[1]
+        self.keyframe_interval = keyframe_interval
+        self.subscribers = []
+        self.frames = 0
+        self._last = None   #rows of the last frame published
+        self._next_keyframe = 0
+
+    def accept(self):
+        """add the spectators waiting to join"""
+        while True:
+            try:
+                sock,address = self.listener.accept()
+            except BlockingIOError:
+                return
+            sock.setblocking(False)
+            self.subscribers.append(Subscriber(sock))
+
+    @property
+    def watching(self):
+        return [subscriber for subscriber in self.subscribers if not subscriber.closed]
+
+    def publish(self,frame):
+        """send frame to every spectator, as a delta from the last frame, or a keyframe to spectators that need one"""
+        self.accept()
+        watching = self.watching
+        if not watching:    #nobody is watching, the next spectator gets a keyframe anyway
+            self._last = None
+            return
+        now = time.monotonic()
+        keyframe_due = now >= self._next_keyframe
+        if keyframe_due:
+            self._next_keyframe = now + self.keyframe_interval
+        #there is nothing to take a delta from after a frame nobody watched, or if the frames size changed
+        resync = self._last is None or len(self._last) != frame.height
+        delta = None if resync else encode_delta(frame,self._last,self.frames)
+        keyframe = None
+
+        for subscriber in watching:
+            subscriber.flush()
+            if subscriber.behind:   #skip the frame, the spectator is sent a keyframe when it catches up
+                subscriber.stale = True
+                subscriber.dropped_frames += 1
+            elif subscriber.stale or keyframe_due or resync:
+                if keyframe is None:    #the keyframe is only encoded if someone needs it
+                    keyframe = encode_keyframe(frame,self.frames)
+                subscriber.send(keyframe)
+                subscriber.stale = False
+            elif delta is not None:
+                subscriber.send(delta)
+        self._last = [row[:] for row in frame.rows]
+        self.frames += 1
+
+    def close(self):
+        for subscriber in self.subscribers:
+            subscriber.close()
+        self.listener.close()
+
+    def stats(self):
+        return {
+            'frames':self.frames,
+            'viewers':len(self.subscribers),
+            'watching':len(self.watching),
+            'subscribers':[subscriber.stats() for subscriber in self.subscribers]}
+
+
+class Viewer():
+    """
+    The viewer class watches a game from a publisher, and draws it to the terminal
+
+    a viewer is described by the following
+        frame: the frame being watched, None until the first keyframe comes in
+        renderer: draws the frame to the terminal
+        keyframes,deltas: number of keyframes and deltas received
+        bytes_received: bytes read from the publisher
+    """
+
+    def __init__(self,host = 'localhost',port = 0,renderer = None):
+        self.sock = socket.create_connection((host,port))
+        self.renderer = renderer or Renderer()
+        self.frame = None
+        self.keyframes = 0
+        self.deltas = 0
+        self.bytes_received = 0
+        self.started = time.monotonic()
+        self._buffer = bytearray()
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes_received / max(time.monotonic() - self.started,1e-9)
+
+    def read_message(self):
+        """returns the next message from the publisher, None once the publisher has closed the connection"""
+        while True:
+            if len(self._buffer) >= LENGTH.size:
+                length = LENGTH.size + LENGTH.unpack_from(self._buffer)[0]
+                if len(self._buffer) >= length:
+                    message = bytes(self._buffer[:length])
+                    del self._buffer[:length]
+                    return message
+            data = self.sock.recv(65536)
+            if not data:
+                return None
+            self.bytes_received += len(data)
+            self._buffer += data
+
+    def apply(self,message):
+        """update the frame with a message"""
+        length,kind,number,width,height = HEADER.unpack_from(message)
+        body = memoryview(message)[HEADER.size:]
+        if kind == KEYFRAME:
+            self.keyframes += 1
+            self.frame = Frame(width,height)
+            symbols = bytes(body).decode()
+            self.frame.rows = [list(symbols[y*width:(y + 1)*width]) for y in range(height)]
+        elif kind == DELTA and self.frame is not None:
+            self.deltas += 1
+            rows = self.frame.rows
+            pos = 0
+            while pos < len(body):
+                y,x,count = RUN.unpack_from(body,pos)
+                pos += RUN.size
+                rows[y][x:x + count] = bytes(body[pos:pos + count]).decode()
+                pos += count
+
+    def watch(self):
+        """draw the game until the publisher closes the connection"""
+        while True:
+            message = self.read_message()
+            if message is None:
+                return
+            self.apply(message)
+            if self.frame is not None:
+                self.renderer.render(self.frame)
+
+    def close(self):
+        self.sock.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'watch a tetris game being broadcast with tetris.py --broadcast')
+    parser.add_argument('--host',default = 'localhost')
+    parser.add_argument('--port',type = int,required = True)
+    args = parser.parse_args()
+
+    viewer = Viewer(args.host,args.port)
+    try:
+        viewer.watch()
+    except KeyboardInterrupt:
+        pass
+    viewer.close()
+    print('{} keyframes, {} deltas, {} bytes, {:.0f} bytes/s'.format(viewer.keyframes,viewer.deltas,viewer.bytes_received,
+          viewer.bytes_per_second))
@@ -0,0 +1,99 @@
+"""
+this file contains the command queue class, which is used to pass actions from input threads to the game loop
+
+input threads only put actions into the queue, the game loop drains the queue and applies the
+actions to the engine, so the engine is only ever changed by the game loop
+"""
+import collections
+import threading
+import time
+
+#default number of commands that can be waiting in a queue, commands put into a full queue are dropped
+MAX_DEPTH = 64
+
+
+class Command_queue():
+    """
+    The command queue class is a bounded, thread safe queue of (action,timestamp) commands
+
+    a command queue keeps the following counters
+        depth: number of commands waiting in the queue
+        max_depth: largest depth the queue has reached
+        dropped: commands dropped because the queue was full
+        applied: commands that have been drained and applied
+        last_latency,max_latency,total_latency: seconds between a command being put into the queue and applied
+    """
+
+    def __init__(self,max_depth = MAX_DEPTH):
+        self.size = max_depth
+        self._commands = collections.deque()
+        self._condition = threading.Condition()
+        self._interrupted = False
+
+        self.max_depth = 0
+        self.dropped = 0
+        self.applied = 0
+        self.last_latency = 0
+        self.max_latency = 0
+        self.total_latency = 0
+
+    @property
+    def depth(self):
+        return len(self._commands)
+
+    @property
+    def average_latency(self):
+        return self.total_latency / self.applied if self.applied else 0
+
+    def put(self,action):
+        """add action to the queue, returns false if the queue was full and the action was dropped"""
+        with self._condition:
+            if len(self._commands) >= self.size:
+                self.dropped += 1
+                return False
+            self._commands.append((action,time.monotonic()))
+            self.max_depth = max(self.max_depth,len(self._commands))
+            self._condition.notify_all()
+            return True
+
+    def drain(self):
+        """remove and return all the (action,timestamp) commands waiting in the queue"""
+        with self._condition:
+            commands = list(self._commands)
+            self._commands.clear()
+            return commands
+
+    def applied_command(self,timestamp):
+        """record that a command put into the queue at timestamp has been applied"""
+        latency = time.monotonic() - timestamp
+        self.applied += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency,latency)
+        self.total_latency += latency
+
+    def wait(self,timeout = None):
+        """
+            wait up to timeout seconds for a command to be put into the queue, or interrupt() to be called
+            returns true if there are commands waiting
+        """
+        with self._condition:
+            if not self._commands and not self._interrupted:
+                self._condition.wait(timeout)
+            self._interrupted = False
+            return bool(self._commands)
+
+    def interrupt(self):
+        """wake up a thread waiting in wait()"""
+        with self._condition:
+            self._interrupted = True
+            self._condition.notify_all()
+
+    def stats(self):
+        return {
+            'depth':self.depth,
+            'max_depth':self.max_depth,
+            'dropped':self.dropped,
+            'applied':self.applied,
+            'last_latency':self.last_latency,
+            'max_latency':self.max_latency,
+            'average_latency':self.average_latency}
@@ -0,0 +1,261 @@
+"""
+this file contains the engine class, which runs the rules of a tetris game without any
+printing, sleeping, or threads
+
+the engine can be driven by the interactive Game class, or run headless at full cpu speed
+
+the whole state of a game can be saved to a small fixed size bytes object with snapshot(), 
+and put back with restore(), used to clone games for searches and to seek in replays
+"""
+from Screen import Screen
+from Shape import SHAPES
+from Pieces import MODES,MASK
+from Settings import Exceptions,Game_settings,Scoring,Movement,Dim
+
+import math
+import struct
+
+#heap rows kept in a snapshot, blocks can land above the top of the board before the game is lost
+SNAPSHOT_ROWS = Dim.BOARD_H + 4
+ROW_FORMAT = 'H' if Dim.BOARD_W <= 16 else 'Q'
+
+#a snapshot holds the following, in order
+#   piece generator: seed,random state,mode,upcoming pieces,bag,pieces dealt from the bag
+#   game: ticks,score,level,total lines cleared,game over
+#   falling block: shape,rotation,x,y
+#   heap: number of rows,hash,row masks,symbols
+#the state is everything up to the heaps hash, the row masks and symbols are read separately so restore can
+#copy them into the heap straight from the snapshot
+STATE_FORMAT = '<QQB{}s{}sB IQHIB BBhh BQ'.format(Game_settings.LOOKAHEAD,len(SHAPES))
+ROWS_FORMAT = '{}{}'.format(SNAPSHOT_ROWS,ROW_FORMAT)
+STATE = struct.Struct(STATE_FORMAT)
+ROWS = struct.Struct('<' + ROWS_FORMAT)
+SNAPSHOT = struct.Struct('{}{}{}s'.format(STATE_FORMAT,ROWS_FORMAT,SNAPSHOT_ROWS*Dim.BOARD_W))
+SYMBOLS_OFFSET = STATE.size + ROWS.size   #where the heaps symbols start in a snapshot
+
+
+class Engine():
+    """
+    the Engine class describes the state of a tetris game, and the actions that can be done to it
+
+    an engine is described by the following
+    screen: the games screen with all objects used to play the game on it, it is never printed by the engine
+    score,level: the games current score and level
+    total_lines_cleared: total lines that have been cleared by the player, used to calculate the current level
+    game_speed: the time that one turn should take, the engine doesnt sleep, its driver uses this
+    game_over: true once the game has been lost
+    ticks: number of gravity ticks done
+    seed: the seed used to generate the games shapes, a random one is picked if None is given
+    piece_mode: how the games pieces are picked, see Pieces.py
+    recorder: Recorder the games actions are written to, see Replay.py, None if the game isnt being recorded
+    """
+
+    #actions that can be passed to step()
+    ACTIONS = (Movement.LEFT,Movement.RIGHT,Movement.DOWN,Movement.ROTATE,Movement.DROP)
+
+    def __init__(self,seed = None,piece_mode = Game_settings.PIECE_MODE):
+        self.piece_mode = piece_mode
+        self._spare_shapes = {}     #{shape type:shape} taken off blocks by restore, reused instead of making new ones
+        self.reset(seed)
+
+    def reset(self,seed = None):
+        """start a new game, games started with the same seed get the same shapes"""
+        self.screen = Screen(seed = seed,piece_mode = self.piece_mode)
+        self.seed = self.screen.pieces.seed
+        self.score = 0
+        self.level = 0
+        self.total_lines_cleared = 0
+        self.game_speed = Game_settings.STARTING_SPEED
+        self.game_over = False
+        self.ticks = 0
+        self.recorder = None
+
+    def step(self,action):
+        """do one of the actions in ACTIONS to the falling block, returns true if the block moved"""
+        if self.game_over:
+            return False
+        if self.recorder:
+            self.recorder.action(action)
+        try:
+            if action == Movement.ROTATE:
+                self.screen.rotate_block()
+                return True
+            elif action == Movement.DROP:
+                self.screen.drop_block()
+                return True
+            return self.screen.move_block(action)
+        except Exceptions.GameOver:
+            self.game_over = True
+            return False
+
+    def apply_commands(self,commands):
+        """drain the actions waiting in a Command_queue and do them, in the order they were put in the queue"""
+        for action,timestamp in commands.drain():
+            self.step(action)
+            commands.applied_command(timestamp)
+
+    def tick(self):
+        """
+            do one gravity tick, the block falls one row and any full rows are cleared
+            returns the number of rows cleared
+        """
+        self.fall()
+        if self.game_over:
+            return 0
+        full_rows = self.mark_full_rows()
+        self.remove_rows(full_rows)
+        return len(full_rows)
+
+    #a tick is split into the following steps, so a driver can print the screen in between them
+
+    def fall(self):
+        """move the falling block down one row"""
+        if self.game_over:
+            return
+        if self.recorder:
+            self.recorder.fall()
+        self.ticks += 1
+        try:
+            self.screen.move_block(Movement.DOWN)
+        except Exceptions.GameOver:
+            self.game_over = True
+
+    def fall_ticks(self,count):
+        """
+            do count gravity ticks, marking and scoring full rows after each one
+            full rows marked by any tick but the last are removed before the next tick, the same as the game does,
+            so rows are never scored twice
+            returns the full rows marked by the last tick, these have not been removed, they should be passed to remove_rows
+            
+            ticks where the block only moves down dont change anything else, so they are done all at once
+        """
+        full_rows = []
+        while count > 0 and not self.game_over:
+            if full_rows:
+                self.remove_rows(full_rows)
+            self.fall()
+            count -= 1
+            if self.game_over:
+                break
+            full_rows = self.mark_full_rows()
+            #if there are no full rows, the ticks until the block lands only move it down
+            #keyframes are written before each tick while recording, so recorded games do every tick
+            if count and not full_rows and not self.recorder:
+                free = min(count,self.screen.game_board.drop_distance())
+                self.screen.game_board.block.location[1] -= free
+                self.ticks += free
+                count -= free
+        return full_rows
+
+    def mark_full_rows(self):
+        """
+            find the full rows, set them to their full symbol, and update the score and level
+            returns the full rows, which should be passed to remove_rows
+        """
+        full_rows = self.screen.get_full_rows() #check if there are any full rows
+        self.screen.set_full_rows(full_rows)
+
+        self.screen.score = self.update_score(len(full_rows))   #update the level and score based num of full_rows
+        self.screen.level = self.update_level(len(full_rows))
+        return full_rows
+
+    def remove_rows(self,full_rows):
+        if full_rows and self.recorder:
+            self.recorder.clear()
+        self.screen.adjust_rows(full_rows)
+
+    def snapshot(self):
+        """
+            returns the state of the game as a SNAPSHOT.size bytes object, that can be passed to restore
+            snapshots should be taken between ticks, after any full rows have been removed
+        """
+        seed,state,queue,bag,dealt = self.screen.pieces.get_state()
+        block = self.screen.game_board.block
+        heap = self.screen.game_board.block_heap
+        padding = SNAPSHOT_ROWS - len(heap.rows)
+        if padding < 0:
+            raise ValueError('the heap is too tall to snapshot')
+        return SNAPSHOT.pack(seed & MASK,state,MODES.index(self.piece_mode),bytes(queue),bytes(bag),dealt,
+                             self.ticks,self.score,self.level,self.total_lines_cleared,self.game_over,
+                             SHAPES.index(type(block.shape)),block.shape.rotation,block.location[0],block.location[1],
+                             len(heap.rows),heap.zobrist,*heap.rows,*[0]*padding,b''.join(heap.symbols) + bytes(padding*heap.width))
+
+    def restore(self,snapshot):
+        """
+            put the game back in the state saved in snapshot, 
+            the engines screen, heap, shapes and piece generator are reused instead of building new ones,
+            the heaps rows and symbols are copied into it straight from snapshot
+            
+            python cant unpack into existing objects, so the tuples of unpacked values and the slices the heaps
+            symbols are copied from are still allocated, nothing else is once the spare shapes have been made
+        """
+        (seed,state,mode,queue,bag,dealt,
+         self.ticks,self.score,self.level,self.total_lines_cleared,game_over,
+         shape,rotation,x,y,height,zobrist) = STATE.unpack_from(snapshot)
+        self.game_over = bool(game_over)
+        self.update_speed()
+        self.screen.score = self.score
+        self.screen.level = self.level
+
+        self.piece_mode = MODES[mode]
+        pieces = self.screen.pieces
+        pieces.mode = self.piece_mode
+        pieces.set_state((seed,state,queue,bag,dealt))
+        self.seed = seed
+
+        board = self.screen.game_board
+        self.set_shape(board.block,SHAPES[shape],rotation)
+        board.block.location[0],board.block.location[1] = x,y
+        self.set_shape(self.screen.next_block.block,SHAPES[queue[0]],0)   #the queue starts at the next piece
+        board.block_heap.restore_rows(ROWS.unpack_from(snapshot,STATE.size),height,snapshot,SYMBOLS_OFFSET,zobrist)
+
+    def set_shape(self,block,shape_type,rotation):
+        """put block in rotation of shape_type, reusing a spare shape of that type if the type changed"""
+        shape = block.shape
+        if type(shape) is not shape_type:
+            #a blocks shape is only used by that block, so the old one is kept to be reused
+            self._spare_shapes[type(shape)] = shape
+            shape = self._spare_shapes.pop(shape_type,None) or shape_type()
+        shape.rotation = rotation
+        block.shape = shape     #the setter updates the blocks description
+
+    @classmethod
+    def from_snapshot(cls,snapshot):
+        """returns a new engine in the state saved in snapshot"""
+        engine = cls(0)
+        engine.restore(snapshot)
+        return engine
+
+    def start_at_level(self,level):
+        """
+            start the game at level, as if enough lines had been cleared to reach it,
+            so the next level is reached after LEVEL_SPACING more lines the same as any other level
+        """
+        self.level = level
+        self.total_lines_cleared = level*Game_settings.LEVEL_SPACING
+        self.screen.level = level
+        self.update_speed()
+
+    def update_score(self,rows_cleared):
+        """this function updates the score,based on the level ,and how many rows were cleared that turn"""
+        #the score multiplier depends on how many rows were cleared
+        multiplier = Scoring.POINTS[rows_cleared]
+        #the added score is calulated as new_score = multiplier x (level + 1)
+        self.score += multiplier*(self.level+1)
+        return self.score
+
+    def update_level(self,rows_cleared):
+        self.total_lines_cleared += rows_cleared
+
+        #total_lines_cleared - level x level_spacing, should be greater than level_spacing if we are
+        #to move on to the next level
+        if self.total_lines_cleared - self.level*Game_settings.LEVEL_SPACING >= Game_settings.LEVEL_SPACING:
+            self.level += 1     #increment level and
+            self.update_speed() #update the speed
+        return self.level
+
+    def update_speed(self):
+        #update speed according to equation
+        #speed = start_speed x e^(-speed_multiplier x level)
+        #this equation probably should be adjusted or changed to later to have the game play the best
+        self.game_speed = Game_settings.STARTING_SPEED * math.exp(-Game_settings.SPEED_MULTIPLIER*self.level)
@@ -0,0 +1,64 @@
+"""
+this file contains the frame class, a 2d grid of charecters that screen objects are painted into
+
+a frame is indexed the same way as the screen, frame[x,y], with [0,0] in the bottom left corner
+"""
+
+#depth of a cell nothing has been painted in, higher than any z index so anything can paint over it
+EMPTY = 255
+
+
+class Frame():
+    """
+    The frame class describes one frame of the screen
+
+    a frame is described by the following
+        width,height: the frames diminsions
+        rows: list of rows, rows[y][x] is the symbol at [x,y]
+        depth: list of bytearray rows, depth[y][x] is the z index of the object that painted [x,y], EMPTY if nothing has
+            lower z indexes are on top of higher ones, so an object can only paint over
+            cells painted by objects with a higher z index
+    """
+
+    __slots__ = ('width','height','rows','depth')
+
+    def __init__(self,width,height,fill = None):
+        self.width = width
+        self.height = height
+        self.rows = [[fill for x in range(width)] for y in range(height)]
+        self.depth = [bytearray([EMPTY])*width for y in range(height)]
+
+    def __getitem__(self,coord):
+        return self.rows[coord[1]][coord[0]]
+
+    def __setitem__(self,coord,symbol):
+        self.rows[coord[1]][coord[0]] = symbol
+
+    def in_bounds(self,x,y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def paint(self,cells,z):
+        """
+            paint (x,y,symbol) cells onto the frame at z index z
+            cells outside the frame, or under something with a lower z index, are skipped
+            returns a list of the [x,y] coords that were painted
+        """
+        painted = []
+        for x,y,symbol in cells:
+            if not self.in_bounds(x,y):
+                continue
+            if z <= self.depth[y][x]:
+                self.rows[y][x] = symbol
+                self.depth[y][x] = z
+                painted.append((x,y))
+        return painted
+
+    def copy(self):
+        frame = Frame(self.width,self.height)
+        frame.rows = [row[:] for row in self.rows]
+        frame.depth = [row[:] for row in self.depth]
+        return frame
+
+    def lines(self):
+        """returns the frames rows as strings from top to bottom, in the format Screen prints them"""
+        return [''.join(symbol + ' ' for symbol in row) for row in reversed(self.rows)]
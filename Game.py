@@ -1,38 +1,83 @@
 """
 this file contains the game class, which is used to describe a complete tetris game
     
-this class uses the getkeys package to get user input
+this class uses the Keyboard class to get user input
 """
-from Screen import Screen
-from Shape import J,L,T,Line,Square,S,Z
-from Settings import Text,Exceptions,Game_settings,Scoring,Input,Movement
+from Engine import Engine
+from Keyboard import Keyboard
+from Commands import Command_queue
+from Scheduler import Scheduler
+from Replay import Recorder
+from Bot import Bot
+from Broadcast import Publisher
+from Settings import Text,Input,Movement
 
-import random
-import os
 import threading
 import time
-import math
-from getkey import getkey, keys #getkey package used to get user input
+
+def key_action(key):
+    """returns the Movement action a key does in the game, None if it doesnt do one"""
+    if key in Input.ROTATE:
+        return Movement.ROTATE
+    elif key in Input.LEFT:
+        return Movement.LEFT
+    elif key in Input.RIGHT:
+        return Movement.RIGHT
+    elif key in Input.DROP:
+        return Movement.DROP
+    return None
     
 class Game():
     """
-    the Game class describes the tetris game
+    the Game class describes the interactive tetris game
+    
+    the rules of the game are run by an Engine, the game prints the engines screen,
+    sleeps between turns, and passes user input to the engine
+    
+    user input is read on its own thread, which only puts actions into a command queue,
+    the game loop is run by a Scheduler, which applies them to the engine as they come in
     
     a game is described by the following
+    engine: the engine running the game
+    commands: queue of actions waiting to be applied to the engine
+    scheduler: runs the game loop, doing gravity ticks and printing the screen
     screen: the games screen with all objects used to play the game on it
-    score,level: the games current score and level
-    total_lines_cleared: total lines that have been cleared by the player, used to calculate the current level
-    game_speed: the time that one turn takes, used to set the speed of the game
     game_active: true if the game is being played, false if it is over 
+    cpu_usage: fraction of a cpu core used by the process during the last call to play()
+    recorder: Recorder writing the game to a replay file, None if the game isnt being recorded
+    bot: Bot playing the game, None if the user is playing
+    publisher: Publisher sending the screen to spectators, None if the game isnt being broadcast
     """
  
-    def __init__(self):
-        self.screen = Screen()
-        self.score = 0
-        self.level = 0
-        self.total_lines_cleared = 0
-        self.game_speed = Game_settings.STARTING_SPEED
+    def __init__(self,seed = None,record = None,autoplay = False,broadcast = None):
+        """
+            if record is given, the game is recorded to a replay file at that path
+            if autoplay is true, a Bot plays the game, the user can still press q to exit
+            if broadcast is given, spectators can watch the game by connecting to that port, see Broadcast.py
+        """
+        self.engine = Engine(seed)
+        self.screen = self.engine.screen
         self.game_active = True
+        self.cpu_usage = None
+        self.commands = Command_queue()
+        self.scheduler = Scheduler(self.engine,self.commands,self.render)
+        self.recorder = Recorder(open(record,'wb'),self.engine) if record else None
+        self.bot = Bot() if autoplay else None
+        self.publisher = Publisher(broadcast) if broadcast is not None else None
+        self._planned_tick = None   #gravity tick the bots last moves were planned on
+
+    @property
+    def score(self):
+        return self.engine.score
+
+    @property
+    def level(self):
+        return self.engine.level
+
+    @property
+    def game_speed(self):
+        """the time that one turn takes"""
+        return self.engine.game_speed
 
     def start(self): 
         """this function prompts the user if they want to play or not, if they do it returns true, else false"""
@@ -50,83 +95,64 @@ class Game():
         """
             this function is used to play the game
             it starts the thread that accepts user input,
-            it executes turn() funciton until the game is lost or has been exited by the user
+            it runs the scheduler until the game is lost or has been exited by the user
             returns false when the game is over
         """  
 
-        th = threading.Thread(target = self.get_input)  #thread to get user input
-        th.start() 
-        while self.game_active: #game_active can be unset by the user, to stop playing the game
-            try:
-                self.turn() #do a turn
-            except Exceptions.GameOver: #until the game has been lost
-                self.game_active = False    #end the game
-                th.join()   #wait for the user input thread to join
-                
+        start_wall,start_cpu = time.monotonic(),time.process_time()
+        with Keyboard() as keyboard:
+            th = threading.Thread(target = self.get_input,args = (keyboard,))  #thread to get user input
+            th.start() 
+            #game_active can be unset by the user, to stop playing the game
+            self.scheduler.run(lambda: self.game_active)
+            self.stop()    #end the game
+            keyboard.wake() #wake the user input thread up, so it sees the game is over
+            th.join()   #wait for the user input thread to join
+        if self.recorder:
+            self.recorder.close()
+            self.recorder.file.close()
+        if self.publisher:
+            self.publisher.close()
+        self.cpu_usage = (time.process_time() - start_cpu) / max(time.monotonic() - start_wall,1e-9)
+
         print(Text.GAME_OVER)
         return False
             
  
-    def turn(self):
-        """this fucntions executes a single turn of the game"""
-
-        self.screen.move_block(Movement.DOWN)   #move the block down
-        self.screen.print() 
-
-        full_rows = self.screen.get_full_rows() #check if there are any full rows
-        self.screen.set_full_rows(full_rows)
-        
-        self.screen.score = self.update_score(len(full_rows))   #update the level and score based num of full_rows
-        self.screen.level = self.update_level(len(full_rows))
-        time.sleep(self.game_speed*.1)  #sleep and update the screen
+    def render(self):
+        """
+            print the screen, called by the scheduler on the game loop
+            when a bot is playing, its moves for the falling block are put in the command queue first,
+            so they go through the same queue as the users input
+            the bot drops at most one block each gravity tick, after any full rows have been removed, 
+            so no more rows are cleared at once than a player could clear
+            when the game is being broadcast, the printed frame is then sent to the spectators
+        """
+        if self.bot and self.scheduler.ticks != self._planned_tick and not self.screen.get_full_rows():
+            self._planned_tick = self.scheduler.ticks
+            for action in self.bot.plan(self.engine):
+                self.commands.put(action)
         self.screen.print()
-        
-        self.screen.adjust_rows(full_rows)  #remove the rows
-        time.sleep(self.game_speed*.9)  #sleep for the remaining turn time
-
-    def update_score(self,rows_cleared):
-        """this function updates the score,based on the level ,and how many rows were cleared that turn"""
-        #the score multiplier depends on how many rows were cleared
-        multiplier = Scoring.POINTS[rows_cleared] 
-        #the added score is calulated as new_score = multiplier x (level + 1)
-        self.score += multiplier*(self.level+1)
-        return self.score 
+        if self.publisher:
+            self.publisher.publish(self.screen.frame)
 
-    def update_level(self,rows_cleared):
-        self.total_lines_cleared += rows_cleared 
-        
-        #total_lines_cleared - level x level_spacing, should be greater than level_spacing if we are 
-        #to move on to the next level
-        if self.total_lines_cleared - self.level*Game_settings.LEVEL_SPACING >= Game_settings.LEVEL_SPACING:
-            self.level += 1     #increment level and
-            self.update_speed() #update the speed
-        return self.level
-
-    def update_speed(self):
-        #update speed according to equation 
-        #speed = start_speed x e^(-speed_multiplier x level)
-        #this equation probably should be adjusted or changed to later to have the game play the best
-        self.game_speed = Game_settings.STARTING_SPEED * math.exp(-Game_settings.SPEED_MULTIPLIER*self.level)
- 
-    def print_game(self):
-        self.board.print_board()
+    def stop(self):
+        self.game_active = False
+        self.commands.interrupt()   #wake up the game loop if it is sleeping
 
-    def get_input(self):
+    def get_input(self,keyboard):
         """
             this function should run as a thread in the background and get input from the player
-            this function uses the getkey package to get one key input from the user with no enter required
+            it waits on the keyboard, so it is idle until a key is pressed or the keyboard is woken up
+            actions are put in the command queue, this thread never changes the engine itself
         """
         while self.game_active:#get input while the game is active
-            key = getkey(blocking=False)    #get user input
-            #check if inoput mathces any actions to be performed
-            if key in Input.ROTATE:
-                self.screen.rotate_block() 
-            elif key in Input.LEFT:
-                self.screen.move_block(Movement.LEFT)
-            elif key in Input.RIGHT:
-                self.screen.move_block(Movement.RIGHT)
-            elif key in Input.DROP:
-                self.screen.drop_block()
-            elif key in Input.QUIT:
-                self.game_active = False    #if we quit the game,set game_active to false
+            for key in keyboard.read_keys():    #get user input
+                #check if inoput mathces any actions to be performed
+                action = key_action(key)
+                if action is not None:
+                    self.commands.put(action)
+                elif key in Input.QUIT:
+                    self.stop()    #if we quit the game, stop the game loop
+                    break
         return  #return from thread when game_active has gone false
@@ -0,0 +1,114 @@
+"""
+this file contains the keyboard class, which is used to wait for key presses without busy polling
+
+on unix the terminal is put in cbreak mode, so keys are read with no enter required,
+and stdin is waited on with a selector, so the process is idle until a key is pressed
+on windows msvcrt is polled at a short interval instead
+"""
+import os
+import sys
+import time
+import selectors
+
+if os.name == 'nt':
+    import msvcrt
+    from getkey import getkey
+else:
+    import termios
+    import tty
+
+#how often msvcrt is polled for keys on windows
+POLL_INTERVAL = .01
+
+#escape sequences start with one of these, and are 3 charecters long (the arrow keys)
+ESCAPE_PREFIXES = ('\x1b[','\x1bO')
+
+def split_keys(text):
+    """split text read from the terminal into keys, escape sequences are kept together as one key"""
+    keys = []
+    i = 0
+    while i < len(text):
+        if text[i:i + 2] in ESCAPE_PREFIXES and i + 2 < len(text):
+            keys.append(text[i:i + 3])
+            i += 3
+        else:
+            keys.append(text[i])
+            i += 1
+    return keys
+
+
+class Keyboard():
+    """
+    The keyboard class reads keys from a terminal
+
+    a keyboard should be used as a context manager, the terminal is restored when it exits
+        with Keyboard() as keyboard:
+            keys = keyboard.read_keys()
+
+    a keyboard is described by the following
+        fd: file descriptor keys are read from, stdin by default
+        selector: selector waiting on fd, and on a pipe used to wake up a waiting read_keys()
+    """
+
+    def __init__(self,fd = None):
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self._saved_mode = None
+        self.selector = None
+        self._woken = False
+
+    def __enter__(self):
+        if os.name == 'nt':
+            return self
+        if os.isatty(self.fd):
+            self._saved_mode = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd)
+        self._wake_r,self._wake_w = os.pipe()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.fd,selectors.EVENT_READ)
+        self.selector.register(self._wake_r,selectors.EVENT_READ)
+        return self
+
+    def __exit__(self,*exc):
+        if self.selector is None:
+            return
+        if self._saved_mode is not None:
+            termios.tcsetattr(self.fd,termios.TCSADRAIN,self._saved_mode)
+        self.selector.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+        self.selector = None
+
+    def wake(self):
+        """wake up a thread waiting in read_keys(), it returns with no keys"""
+        self._woken = True
+        if self.selector is not None:
+            os.write(self._wake_w,b'\0')
+
+    def read_keys(self,timeout = None):
+        """
+            wait up to timeout seconds (forever if None) for keys to be pressed,
+            returns a list of the keys pressed, empty if there were none or wake() was called
+        """
+        if os.name == 'nt':
+            return self._read_keys_windows(timeout)
+        keys = []
+        for key,events in self.selector.select(timeout):
+            data = os.read(key.fd,1024)
+            if key.fd != self.fd:
+                continue
+            if not data:    #stdin was closed, stop waiting on it so select doesnt return straight away forever
+                self.selector.unregister(self.fd)
+            keys += split_keys(data.decode(errors = 'ignore'))
+        return keys
+
+    def _read_keys_windows(self,timeout):
+        end = None if timeout is None else time.monotonic() + timeout
+        while not msvcrt.kbhit():
+            if self._woken or (end is not None and time.monotonic() >= end):
+                self._woken = False
+                return []
+            time.sleep(POLL_INTERVAL)
+        keys = []
+        while msvcrt.kbhit():
+            keys.append(getkey())
+        return keys
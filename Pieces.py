@@ -0,0 +1,117 @@
+"""
+this file contains the piece generator class, which picks the shapes of the falling blocks in a game
+
+pieces are picked with a small seeded random number generator (splitmix64), so a game started with
+the same seed always gets the same pieces, in the interactive game, the headless engine and the batch engine
+
+pieces can be picked in two modes
+    uniform: every piece is picked at random from all the shapes
+    bag: the shapes are dealt from a shuffled bag holding one of each shape, refilled when it is empty
+"""
+from Shape import SHAPES
+from Settings import Game_settings
+
+import os
+
+#piece modes
+UNIFORM = 'uniform'
+BAG = 'bag'
+MODES = (UNIFORM,BAG)
+
+#random numbers are 64 bits
+MASK = (1 << 64) - 1
+
+def random_seed():
+    """returns a new random seed, used when a game isnt given one"""
+    return int.from_bytes(os.urandom(8),'little')
+
+
+class Piece_generator():
+    """
+    The piece generator class picks a seeded sequence of shapes
+
+    upcoming pieces are generated ahead of time into a ring buffer, so they can be shown on the screen
+
+    a piece generator is described by the following
+        seed: the seed the sequence was started from
+        mode: UNIFORM or BAG
+        state: the 64 bit state of the random number generator
+        lookahead: number of upcoming pieces that can be looked at with peek()
+    """
+
+    __slots__ = ('seed','mode','state','lookahead','_queue','_head','_bag','_dealt')
+
+    def __init__(self,seed = None,mode = Game_settings.PIECE_MODE,lookahead = Game_settings.LOOKAHEAD):
+        if mode not in MODES:
+            raise ValueError('piece mode must be one of {}'.format(MODES))
+        self.seed = random_seed() if seed is None else seed
+        self.mode = mode
+        self.state = self.seed & MASK
+        self.lookahead = lookahead
+
+        self._bag = list(range(len(SHAPES)))
+        self._dealt = len(self._bag)    #the bag starts empty, so it is shuffled before the first piece
+        #ring buffer of upcoming shape indexes, _head is the index of the next one
+        self._queue = [self.generate() for i in range(lookahead)]
+        self._head = 0
+
+    def random(self):
+        """returns the next random 64 bit number, using splitmix64"""
+        self.state = (self.state + 0x9E3779B97F4A7C15) & MASK
+        z = self.state
+        z = ((z ^ (z >> 30))*0xBF58476D1CE4E5B9) & MASK
+        z = ((z ^ (z >> 27))*0x94D049BB133111EB) & MASK
+        return z ^ (z >> 31)
+
+    def randrange(self,n):
+        """returns a random int from 0 to n - 1"""
+        return (self.random()*n) >> 64
+
+    def generate(self):
+        """pick the index in SHAPES of a new piece"""
+        if self.mode == UNIFORM:
+            return self.randrange(len(SHAPES))
+        bag = self._bag
+        if self._dealt == len(bag):     #shuffle the bag when it runs out
+            for i in range(len(bag) - 1,0,-1):
+                j = self.randrange(i + 1)
+                bag[i],bag[j] = bag[j],bag[i]
+            self._dealt = 0
+        self._dealt += 1
+        return bag[self._dealt - 1]
+
+    def next_index(self):
+        """returns the index in SHAPES of the next piece, and generates a new piece at the end of the queue"""
+        index = self._queue[self._head]
+        self._queue[self._head] = self.generate()
+        self._head = (self._head + 1) % self.lookahead
+        return index
+
+    def next_shape(self):
+        """returns a new shape for the next piece"""
+        return SHAPES[self.next_index()]()
+
+    def peek(self,count = 1):
+        """returns the indexes in SHAPES of the next count pieces, without taking them"""
+        if count > self.lookahead:
+            raise ValueError('can only look {} pieces ahead'.format(self.lookahead))
+        return tuple(self._queue[(self._head + i) % self.lookahead] for i in range(count))
+
+    def get_state(self):
+        """returns the state of the generator as a tuple of plain values, that can be passed to set_state"""
+        return (self.seed,self.state,self.peek(self.lookahead),tuple(self._bag),self._dealt)
+
+    def set_state(self,state):
+        """put the generator in a state returned by get_state"""
+        self.seed,self.state,queue,bag,self._dealt = state
+        if len(queue) == self.lookahead:    #the queue and bag are reused when they are the same size
+            self._queue[:] = queue
+        else:
+            self.lookahead = len(queue)
+            self._queue = list(queue)
+        self._head = 0
+        self._bag[:] = bag
+
+    def upcoming(self,count = 1):
+        """returns the shape types of the next count pieces, without taking them"""
+        return tuple(SHAPES[index] for index in self.peek(count))
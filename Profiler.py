@@ -0,0 +1,233 @@
+"""
+this file contains the profiler used to find out where a game spends its time, with little enough overhead
+to leave on for a whole game
+
+the sampling profiler wakes up every sample interval and records the python stack of every thread,
+weighted by the time since the last sample, so time spent waiting shows up as well as time spent running
+it writes a report of the time spent in each function, and the stacks in the collapsed format used by flamegraph tools:
+    flamegraph.pl game.collapsed > game.svg
+
+the phase timer wraps the methods of a Game that do each phase of the game loop, and adds up the time spent in each:
+    input: putting user input in the command queue, and applying it to the engine
+    turn: gravity ticks and removing full rows
+    print: printing the screen
+    sleep: the game loop waiting for the next thing it has to do
+
+to profile a game, or a replay played back headless:
+    python3 tetris.py --profile game
+    python3 Replay.py game.replay --profile replay
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+#seconds between samples
+SAMPLE_INTERVAL = .005
+
+#number of functions listed in the report
+REPORT_FUNCTIONS = 40
+
+#phases of the game loop
+INPUT = 'input'
+TURN = 'turn'
+PRINT = 'print'
+SLEEP = 'sleep'
+PHASES = (INPUT,TURN,PRINT,SLEEP)
+
+
+class Profiler():
+    """
+    The profiler class samples the stacks of every thread in the process
+
+    a profiler should be used as a context manager, it samples until it exits
+        with Profiler() as profiler:
+            game.play()
+
+    a profiler is described by the following
+        interval: seconds between samples
+        stacks: Counter of {(thread name,function,...):seconds}, with the outermost function first
+        samples: number of samples taken
+        seconds,cpu_seconds: wall and cpu time the profiler ran for
+    """
+
+    def __init__(self,interval = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.seconds = 0
+        self.cpu_seconds = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._labels = {}   #{code object:label}, so each function is only named once
+        self._names = {}    #{thread id:thread name}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self,*exc):
+        self.stop()
+
+    def start(self):
+        self._start_wall,self._start_cpu = time.perf_counter(),time.process_time()
+        self._thread = threading.Thread(target = self.run,name = 'profiler',daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.seconds = time.perf_counter() - self._start_wall
+        self.cpu_seconds = time.process_time() - self._start_cpu
+
+    def label(self,code):
+        label = self._labels.get(code)
+        if label is None:
+            label = '{}:{}'.format(os.path.basename(code.co_filename),getattr(code,'co_qualname',code.co_name))
+            self._labels[code] = label
+        return label
+
+    def thread_name(self,ident):
+        name = self._names.get(ident)
+        if name is None:    #only look the threads up again when a new one has started
+            self._names = {thread.ident:thread.name for thread in threading.enumerate()}
+            name = self._names.get(ident,str(ident))
+        return name
+
+    def run(self):
+        """take samples until stop() is called, run on the profilers own thread"""
+        me = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            #each sample stands for the time since the last one, so late samples dont undercount
+            weight = now - last
+            last = now
+            for ident,frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self.label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(self.thread_name(ident))
+                stack.reverse()
+                self.stacks[tuple(stack)] += weight
+            self.samples += 1
+
+    def functions(self):
+        """returns {function:[self seconds,total seconds]}, total seconds includes the functions it called"""
+        functions = collections.defaultdict(lambda: [0,0])
+        for stack,seconds in self.stacks.items():
+            functions[stack[-1]][0] += seconds
+            for function in set(stack[1:]):     #recursive functions are only counted once per stack
+                functions[function][1] += seconds
+        return functions
+
+    def write_collapsed(self,path):
+        """write the stacks in the collapsed stack format, one stack per line followed by its time in microseconds"""
+        with open(path,'w') as f:
+            for stack,seconds in sorted(self.stacks.items()):
+                f.write('{} {}\n'.format(';'.join(stack),int(seconds*1e6)))
+
+    def report(self,functions = REPORT_FUNCTIONS):
+        """returns the report of the time spent in the functions that took the most time, as a list of lines"""
+        lines = ['{} samples over {:.3f}s, {:.3f}s of cpu ({:.1%} of a core)'.format(self.samples,self.seconds,
+                 self.cpu_seconds,self.cpu_seconds / max(self.seconds,1e-9)),
+                 '',
+                 '{:>10} {:>7} {:>10} {:>7}  function'.format('self s','self %','total s','total %')]
+        total = sum(self.stacks.values()) or 1
+        ranked = sorted(self.functions().items(),key = lambda item: item[1][0],reverse = True)
+        for function,(own,inclusive) in ranked[:functions]:
+            lines.append('{:>10.3f} {:>7.1%} {:>10.3f} {:>7.1%}  {}'.format(own,own / total,inclusive,inclusive / total,function))
+        return lines
+
+
+class Phase_timer():
+    """
+    The phase timer class adds up the time spent in each phase of the game loop
+
+    methods are timed by replacing them on their object with a wrapper, with wrap()
+    time spent in a phase started inside another phase is only counted to the inner one,
+        so input applied during a gravity tick is counted as input and not as the tick
+
+    a phase timer is described by the following
+        phases: {phase:[calls,seconds,longest call in seconds]} of every phase timed so far
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._threads = []  #the phases of each thread, so threads dont have to share them
+
+    def thread_phases(self):
+        local = self._local
+        if not hasattr(local,'phases'):
+            local.phases = {}
+            local.stack = []    #time spent in phases started inside each phase running on this thread
+            self._threads.append(local.phases)
+        return local.phases,local.stack
+
+    def wrap(self,obj,name,phase):
+        """time every call to obj.name as phase"""
+        method = getattr(obj,name)
+        def timed(*args,**kwargs):
+            phases,stack = self.thread_phases()
+            stack.append(0)
+            start = time.perf_counter()
+            try:
+                return method(*args,**kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                inner = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                totals = phases.get(phase)
+                if totals is None:
+                    totals = phases[phase] = [0,0,0]
+                totals[0] += 1
+                totals[1] += elapsed - inner
+                totals[2] = max(totals[2],elapsed - inner)
+        setattr(obj,name,timed)
+
+    def time_game(self,game):
+        """wrap the methods of a Game that do each of PHASES"""
+        self.wrap(game.commands,'put',INPUT)
+        self.wrap(game.engine,'apply_commands',INPUT)
+        self.wrap(game.scheduler,'tick',TURN)
+        self.wrap(game.engine,'remove_rows',TURN)
+        self.wrap(game.screen,'print',PRINT)
+        self.wrap(game.commands,'wait',SLEEP)
+
+    @property
+    def phases(self):
+        phases = {}
+        for thread in self._threads:
+            for phase,(calls,seconds,longest) in thread.items():
+                totals = phases.setdefault(phase,[0,0,0])
+                totals[0] += calls
+                totals[1] += seconds
+                totals[2] = max(totals[2],longest)
+        return phases
+
+    def report(self,seconds):
+        """returns the report of the time spent in each phase, out of seconds of the game loop, as a list of lines"""
+        lines = ['{:>8} {:>8} {:>10} {:>7} {:>10} {:>10}'.format('phase','calls','seconds','%','avg ms','max ms')]
+        phases = self.phases
+        for phase in PHASES:
+            calls,spent,longest = phases.get(phase,(0,0,0))
+            lines.append('{:>8} {:>8} {:>10.3f} {:>7.1%} {:>10.3f} {:>10.3f}'.format(phase,calls,spent,spent / max(seconds,1e-9),
+                         spent / calls*1e3 if calls else 0,longest*1e3))
+        #the rest of the game loop, such as the autoplayer planning its moves before the screen is printed
+        other = seconds - sum(spent for calls,spent,longest in phases.values())
+        lines.append('{:>8} {:>8} {:>10.3f} {:>7.1%}'.format('other','',other,other / max(seconds,1e-9)))
+        return lines
+
+def write_report(path,profiler,phase_timer = None,seconds = None):
+    """write the report of profiler, and of phase_timer over seconds of the game loop if it is given, to path"""
+    lines = []
+    if phase_timer is not None:
+        lines += phase_timer.report(seconds) + ['']
+    lines += profiler.report()
+    with open(path,'w') as f:
+        f.write('\n'.join(lines) + '\n')
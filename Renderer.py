@@ -0,0 +1,118 @@
+"""
+this file contains the renderer class, which is used to write frames to the terminal
+
+instead of clearing the terminal and printing every cell, the renderer keeps the last frame
+it wrote and only writes the cells that changed, using ansi escape codes to move the cursor
+"""
+import os
+import sys
+import shutil
+
+CLEAR = '\x1b[2J'   #clears the terminal
+HOME = '\x1b[H'     #moves the cursor to the top left corner
+
+#cells are printed with a space after them, so each cell is 2 charecters wide on the terminal
+CELL_W = 2
+
+def move_cursor(row,col):
+    """returns the escape code moving the cursor to row,col (rows and cols start at 1)"""
+    return '\x1b[{};{}H'.format(row,col)
+
+class Renderer():
+    """
+    The renderer writes frames to a stream, by default stdout
+
+    a renderer is described by the following
+        stream: the stream frames are written to, defaults to sys.stdout when None
+        newline: the line ending written between rows
+        frames: number of frames rendered
+        full_repaints: number of frames that had to be repainted completely
+        last_frame_bytes: bytes written for the last frame
+        total_bytes: bytes written for all frames
+    """
+
+    def __init__(self,stream = None,newline = '\n'):
+        self.stream = stream
+        self.newline = newline
+        self._last = None   #rows of the last frame written, None if the next frame needs a full repaint
+        self._terminal_size = None
+        self._end_row = 1   #row the cursor is left on after a frame
+
+        self.frames = 0
+        self.full_repaints = 0
+        self.last_frame_bytes = 0
+        self.total_bytes = 0
+
+        if os.name == 'nt':
+            os.system('') #enables ansi escape codes on the windows console
+
+    @property
+    def bytes_per_frame(self):
+        return self.total_bytes / self.frames if self.frames else 0
+
+    def invalidate(self):
+        """force the next frame to be fully repainted, used after something else has written to the terminal"""
+        self._last = None
+
+    def clear(self):
+        """clear the terminal"""
+        self.write(CLEAR + HOME)
+        self.invalidate()
+
+    def render(self,frame,footer = ''):
+        """
+            write frame to the stream, followed by the footer text
+            only changed cells are written, unless this is the first frame or the terminal was resized
+        """
+        #the stream is not a terminal when output is redirected, so its size never changes
+        terminal_size = shutil.get_terminal_size() if self.stream is None else None
+        if self._last is None or terminal_size != self._terminal_size or len(self._last) != frame.height:
+            out = self.full_frame(frame,footer)
+            self.full_repaints += 1
+        else:
+            out = self.diff_frame(frame)
+        self._terminal_size = terminal_size
+        self._last = [row[:] for row in frame.rows]
+
+        self.last_frame_bytes = self.write(out)
+        self.total_bytes += self.last_frame_bytes
+        self.frames += 1
+
+    def full_frame(self,frame,footer):
+        """returns the output for repainting the entire frame and footer"""
+        text = self.newline.join(frame.lines()) + self.newline + footer.replace('\n',self.newline)
+        self._end_row = text.count(self.newline) + 1
+        return CLEAR + HOME + text
+
+    def diff_frame(self,frame):
+        """returns the output for writing only the cells that changed since the last frame"""
+        out = []
+        for y,row in enumerate(frame.rows):
+            last_row = self._last[y]
+            if row == last_row:
+                continue
+            terminal_row = frame.height - y
+            x = 0
+            while x < frame.width:
+                if row[x] == last_row[x]:
+                    x += 1
+                    continue
+                #group runs of changed cells, so the cursor only has to be moved once for each run
+                start = x
+                while x < frame.width and row[x] != last_row[x]:
+                    x += 1
+                out.append(move_cursor(terminal_row,start*CELL_W + 1))
+                out.append(' '.join(row[start:x]))
+        if not out:
+            return ''
+        out.append(move_cursor(self._end_row,1))
+        return ''.join(out)
+
+    def write(self,out):
+        """write out to the stream in a single call, returns the number of bytes written"""
+        if not out:
+            return 0
+        stream = self.stream or sys.stdout
+        stream.write(out)
+        stream.flush()
+        return len(out.encode())
@@ -0,0 +1,229 @@
+"""
+this file contains the classes used to record games to replay files, and play them back
+
+a replay file holds the games seed, and a stream of the events that changed the game,
+gravity ticks are not stored, only the number of ticks between events, so a replay is only a few bytes per action
+
+the file is laid out as follows
+    header: MAGIC, the format VERSION, the piece mode, the 64 bit seed, and the keyframe interval
+    events: a varint of the ticks since the last event, followed by one byte giving the event code
+        keyframe events are followed by a varint length and a snapshot of the engine
+
+replays are played back through an Engine with no sleeping or printing, as fast as the engine can run
+keyframes are written every keyframe interval ticks, so a replay can seek to a tick without playing it from the start
+
+to play a replay and print the final score:
+    python3 Replay.py game.replay
+"""
+from Engine import Engine
+from Pieces import MODES
+from Profiler import Profiler,write_report
+
+import argparse
+import bisect
+import struct
+import time
+
+MAGIC = b'TTRP'
+VERSION = 3
+
+#event codes, codes below len(Engine.ACTIONS) are the action at that index in Engine.ACTIONS
+CLEAR = len(Engine.ACTIONS)     #the full rows marked at the last tick were removed
+KEYFRAME = CLEAR + 1            #the state of the engine, before the next gravity tick
+END = KEYFRAME + 1              #the recording stopped
+
+ACTION_CODES = {action:code for code,action in enumerate(Engine.ACTIONS)}
+
+#ticks between keyframes
+KEYFRAME_INTERVAL = 500
+
+HEADER = struct.Struct('<4sBBQ')
+
+def write_varint(out,value):
+    """append value to the bytearray out, 7 bits at a time with the high bit set on every byte but the last"""
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data,pos):
+    """read a varint from data at pos, returns (value,position after the varint)"""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value,pos
+        shift += 7
+
+
+class Recorder():
+    """
+    The recorder class writes the events of an engines game to a binary file
+
+    the engine calls the recorder as actions are done and rows are cleared,
+    close() has to be called when the game is over to write the end of the replay
+
+    a recorder is described by the following
+        file: binary file the replay is written to
+        engine: the engine being recorded
+        keyframe_interval: ticks between keyframes
+        events: number of events written
+    """
+
+    def __init__(self,file,engine,keyframe_interval = KEYFRAME_INTERVAL):
+        self.file = file
+        self.engine = engine
+        self.keyframe_interval = keyframe_interval
+        self.events = 0
+        self._last_tick = engine.ticks
+
+        header = bytearray(HEADER.pack(MAGIC,VERSION,MODES.index(engine.piece_mode),engine.seed & (1 << 64) - 1))
+        write_varint(header,keyframe_interval)
+        self.file.write(header)
+        engine.recorder = self
+
+    def write(self,code,payload = None):
+        """write an event with code, at the engines current tick"""
+        event = bytearray()
+        write_varint(event,self.engine.ticks - self._last_tick)
+        event.append(code)
+        if payload is not None:
+            write_varint(event,len(payload))
+            event += payload
+        self.file.write(event)
+        self._last_tick = self.engine.ticks
+        self.events += 1
+
+    def action(self,action):
+        self.write(ACTION_CODES[action])
+
+    def clear(self):
+        self.write(CLEAR)
+
+    def fall(self):
+        """called before each gravity tick, writes a keyframe every keyframe_interval ticks"""
+        if self.engine.ticks and self.engine.ticks % self.keyframe_interval == 0:
+            self.write(KEYFRAME,self.engine.snapshot())
+
+    def close(self):
+        """write the end of the replay, and stop recording"""
+        self.write(END)
+        self.file.flush()
+        self.engine.recorder = None
+
+
+class Replay():
+    """
+    The replay class plays back a game from a replay file
+
+    a replay is described by the following
+        data: the bytes of the replay file
+        seed,piece_mode: the seed and piece mode the game was played with
+        keyframe_interval: ticks between keyframes in the file
+        keyframes: sorted list of (tick,position of the next event,position of the state) of each keyframe
+    """
+
+    def __init__(self,data):
+        self.data = bytes(data)
+        magic,version,mode,self.seed = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a version {} replay file'.format(VERSION))
+        self.piece_mode = MODES[mode]
+        self.keyframe_interval,self.start = read_varint(self.data,HEADER.size)
+        self.keyframes = self.find_keyframes()
+
+    @classmethod
+    def load(cls,path):
+        with open(path,'rb') as f:
+            return cls(f.read())
+
+    def find_keyframes(self):
+        """scan the events for keyframes, without playing the game"""
+        data = self.data
+        keyframes = []
+        pos = self.start
+        tick = 0
+        while pos < len(data):
+            delta,pos = read_varint(data,pos)
+            tick += delta
+            code = data[pos]
+            pos += 1
+            if code == KEYFRAME:
+                length,state = read_varint(data,pos)
+                pos = state + length
+                keyframes.append((tick,pos,state))
+            elif code == END:
+                break
+        return keyframes
+
+    def play(self,until = None):
+        """play the replay from the start, returns the engine after tick until, or after the end of the game if until is None"""
+        engine = Engine(self.seed,self.piece_mode)
+        return self.run(engine,self.start,until)
+
+    def seek(self,tick):
+        """returns the engine after tick, playing from the last keyframe at or before tick"""
+        i = bisect.bisect_right(self.keyframes,(tick,float('inf'))) - 1
+        if i < 0:
+            return self.play(tick)
+        keyframe_tick,pos,state = self.keyframes[i]
+        engine = Engine.from_snapshot(self.data[state:pos])
+        return self.run(engine,pos,tick)
+
+    def run(self,engine,pos,until = None):
+        """play the events starting at pos through engine, stopping after tick until"""
+        data = self.data
+        actions = Engine.ACTIONS
+        full_rows = []
+        while pos < len(data):
+            delta,pos = read_varint(data,pos)
+            code = data[pos]
+            pos += 1
+            tick = engine.ticks + delta
+            if until is not None and tick > until:
+                break
+            if tick > engine.ticks:     #do the gravity ticks between events
+                full_rows = engine.fall_ticks(tick - engine.ticks)
+            if code < CLEAR:
+                engine.step(actions[code])
+            elif code == CLEAR:
+                engine.remove_rows(full_rows)
+                full_rows = []
+            elif code == KEYFRAME:
+                length,pos = read_varint(data,pos)
+                pos += length
+            elif code == END:
+                return engine
+        #no rows are cleared after the last event before until, so these ticks only move the block down
+        if until is not None and until > engine.ticks:
+            engine.fall_ticks(until - engine.ticks)
+        return engine
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'play back a recorded tetris game')
+    parser.add_argument('replay',help = 'replay file to play')
+    parser.add_argument('--seek',type = int,help = 'stop at this tick, starting from the closest keyframe')
+    parser.add_argument('--times',type = int,default = 1,help = 'play the replay this many times, to measure playback speed')
+    parser.add_argument('--profile',metavar = 'NAME',
+                        help = 'profile the playback, writing a report to NAME.txt and collapsed stacks to NAME.collapsed')
+    args = parser.parse_args()
+
+    replay = Replay.load(args.replay)
+    profiler = Profiler() if args.profile else None
+    if profiler:
+        profiler.start()
+    start = time.perf_counter()
+    for i in range(args.times):
+        engine = replay.play() if args.seek is None else replay.seek(args.seek)
+    seconds = time.perf_counter() - start
+    if profiler:
+        profiler.stop()
+        write_report(args.profile + '.txt',profiler)
+        profiler.write_collapsed(args.profile + '.collapsed')
+    print('seed {} ({} pieces), {} keyframes'.format(replay.seed,replay.piece_mode,len(replay.keyframes)))
+    print('tick {}: score {}, level {}, lines {}{}'.format(engine.ticks,engine.score,engine.level,
+          engine.total_lines_cleared,', game over' if engine.game_over else ''))
+    print('{:.1f} replays/s'.format(args.times / seconds))
@@ -0,0 +1,131 @@
+"""
+this file contains the scheduler class, which runs the game loop on a fixed timestep
+
+gravity ticks are scheduled on a monotonic clock, every game_speed seconds from when the game
+started, so time spent rendering or applying input doesnt slow the game down
+rendering is capped to a frame rate, and is done as soon as possible after anything changes
+"""
+from Settings import Game_settings
+
+import collections
+import time
+
+#if the scheduler falls this many ticks behind, it skips them instead of trying to catch up
+MAX_CATCH_UP = 5
+
+#number of tick jitters kept in the jitter log
+JITTER_LOG_SIZE = 1000
+
+
+class Scheduler():
+    """
+    The scheduler class runs an engine, applying commands, doing gravity ticks, and rendering
+
+    a scheduler is described by the following
+        engine: the engine being run
+        commands: Command_queue of input to apply to the engine
+        render: function called to draw a frame
+        frame_time: shortest time between two frames
+        jitter_log: how late each of the last gravity ticks was, in seconds
+        ticks,frames: number of gravity ticks and frames done
+        skipped_ticks: ticks skipped because the scheduler fell too far behind
+    """
+
+    def __init__(self,engine,commands,render,frame_rate = Game_settings.FRAME_RATE):
+        self.engine = engine
+        self.commands = commands
+        self.render = render
+        self.frame_time = 1 / frame_rate
+
+        self.jitter_log = collections.deque(maxlen = JITTER_LOG_SIZE)
+        self.max_jitter = 0
+        self.ticks = 0
+        self.frames = 0
+        self.skipped_ticks = 0
+
+        self._full_rows = []    #full rows being shown before they are removed
+        self._clear_at = None   #time the full rows should be removed
+        self._dirty = True      #true if the screen has changed since the last frame
+
+    @property
+    def average_jitter(self):
+        return sum(self.jitter_log) / len(self.jitter_log) if self.jitter_log else 0
+
+    def run(self,active):
+        """run the game until active() returns false or the game is lost"""
+        now = time.monotonic()
+        next_tick = now + self.engine.game_speed
+        next_frame = now
+        while active() and not self.engine.game_over:
+            now = time.monotonic()
+
+            if now >= next_tick:
+                self.tick(now - next_tick)
+                #the next tick is scheduled from when this one should have happened, not when it did,
+                #so time spent in this loop doesnt add up over the game
+                next_tick += self.engine.game_speed
+                if now - next_tick > MAX_CATCH_UP*self.engine.game_speed:
+                    skipped = int((now - next_tick) / self.engine.game_speed)
+                    self.skipped_ticks += skipped
+                    next_tick += skipped*self.engine.game_speed
+
+            if self._clear_at is not None and now >= self._clear_at:
+                self.engine.remove_rows(self._full_rows)  #remove the rows after they have been shown
+                self._full_rows = []
+                self._clear_at = None
+                self._dirty = True
+
+            if self._dirty and now >= next_frame:
+                self.render()
+                self.frames += 1
+                self._dirty = False
+                next_frame = now + self.frame_time
+
+            #sleep until the next thing that has to be done, or until input comes in
+            deadlines = [next_tick]
+            if self._clear_at is not None:
+                deadlines.append(self._clear_at)
+            if self._dirty:
+                deadlines.append(next_frame)
+            timeout = min(deadlines) - time.monotonic()
+            if timeout > 0:
+                self.commands.wait(timeout)
+            if self.commands.depth: #input is applied and drawn straight away
+                self.engine.apply_commands(self.commands)
+                self._dirty = True
+
+    def tick(self,jitter):
+        """do one gravity tick, jitter is how late the tick is"""
+        self.jitter_log.append(jitter)
+        self.max_jitter = max(self.max_jitter,jitter)
+        self.ticks += 1
+
+        self.engine.apply_commands(self.commands)
+        if self._clear_at is not None:  #rows from the last tick havent been removed yet
+            self.engine.remove_rows(self._full_rows)
+            self._clear_at = None
+        self.engine.fall()
+        self._dirty = True
+        if self.engine.game_over:
+            return
+
+        #full rows are shown for part of a tick before they are removed, without blocking the loop
+        self._full_rows = self.engine.mark_full_rows()
+        if self._full_rows:
+            self._clear_at = time.monotonic() + self.engine.game_speed*Game_settings.CLEAR_TIME
+
+    def jitter_percentile(self,percent):
+        """returns the jitter that percent of the logged ticks were at or under"""
+        if not self.jitter_log:
+            return 0
+        jitters = sorted(self.jitter_log)
+        return jitters[min(len(jitters) - 1,int(len(jitters)*percent/100))]
+
+    def stats(self):
+        return {
+            'ticks':self.ticks,
+            'frames':self.frames,
+            'skipped_ticks':self.skipped_ticks,
+            'max_jitter':self.max_jitter,
+            'average_jitter':self.average_jitter,
+            'p99_jitter':self.jitter_percentile(99)}
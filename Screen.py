@@ -2,13 +2,13 @@
 this file contains the class used to describe the screen that the tetris game is played on
 """
 
-from Screen_objects import Block,Box,Block_heap,Block_box,Multi_line_text,Game_board,Background
-from Shape import Shape,J,L,T,Line,Square,S,Z
-from Settings import Dim,Symbols,Text,Movement
+from Screen_objects import Block,Box,Block_heap,Bit_block_heap,Block_box,Multi_line_text,Game_board,Background,index_layers
+from Pieces import Piece_generator
+from Settings import Dim,Symbols,Text,Movement,Collision,Game_settings
+from Frame import Frame
+from Renderer import Renderer
 
-import os
 import time
-import random
 import copy
 
 
@@ -27,10 +27,6 @@ LEVEL_LOCATION = [13,9]
 
 SCORE_LOCATION = [13,5]
 
-def random_shape():
-    """this class returns a random shape"""
-    return random.choice([J(),Square(),L(),T(),Line(),S(),Z()]) 
-
 class Screen():
     """
     The screen class describes the screen on which a game of tetris is played 
@@ -42,28 +38,69 @@ class Screen():
         level:text displaying the current level
         score:text displaying the current score
         background:background that spans the entier screen
+        pieces: piece generator picking the shapes of the falling blocks, started from seed
+            the next block box shows the first of the pieces waiting in the generator
 
     """
    
-    def __init__(self,level = 0,score = 0):
-        self.game_board = Game_board(random_shape(),Dim.BOARD_H,Dim.BOARD_W,BOARD_LOCATION,Symbols.BOARDER)
-        self.next_block = Block_box(random_shape(),BOX_H,BOX_W,Text.NEXT_BLOCK,NEXT_BLOCK_LOCATION,Symbols.BOX)
+    def __init__(self,level = 0,score = 0,seed = None,piece_mode = Game_settings.PIECE_MODE):
+        self.pieces = Piece_generator(seed,piece_mode)
+        self.game_board = Game_board(self.pieces.next_shape(),Dim.BOARD_H,Dim.BOARD_W,BOARD_LOCATION,Symbols.BOARDER,Bit_block_heap,
+                                     Symbols.GHOST if Game_settings.GHOST else None)
+        self.next_block = Block_box(self.pieces.upcoming()[0](),BOX_H,BOX_W,Text.NEXT_BLOCK,NEXT_BLOCK_LOCATION,Symbols.BOX)
         self._level = Multi_line_text(LEVEL_LOCATION,[Text.LEVEL,str(level)])
         self._score = Multi_line_text(SCORE_LOCATION,[Text.SCORE,str(score)])
         self.background = Background(Dim.SCREEN_H + 1,Dim.SCREEN_W + 1,CORNER,Symbols.BLANK)
 
         #all objects on screen are collected in this list 
         self.objects = [self.game_board,self.next_block,self._level,self._score,self.background]
- 
+
+        #objects that never change after they are placed on screen, 
+        #these are painted once into a cached frame instead of being repainted every frame
+        self.static_objects = [self.game_board.boarder,self.next_block.boarder,self.next_block.label,
+                               self._level.objects[0],self._score.objects[0],self.background]
+        self.build_frame()
+
+        self.renderer = Renderer()
+
+    def build_frame(self):
+        """
+            split the objects into the static objects, painted once into a cached frame, 
+            and the remaining objects that have to be repainted when they change
+            
+            objects are given a z index by their order in self.objects, so objects 
+            earlier in the list are painted on top of later ones
+
+            the cached frame is only painted the first time the screen is composed, 
+            so screens of headless games never paint it
+        """
+        layers = [layer for obj in self.objects for layer in obj.layers()]
+        self._layers = layers
+        self._static = [(z,layer) for z,layer in enumerate(layers) if layer in self.static_objects]
+        self._dynamic = [(z,layer) for z,layer in enumerate(layers) if layer not in self.static_objects]
+
+        self._static_frame = None
+        self.frame = None
+        self.dirty_count = 0    #number of cells that changed in the last frame
+
+        #{(x,y):screen object} index of the object shown at each coord, rebuilt when a dynamic object changes
+        self._index = None
+        self._index_state = None
+
     def __getitem__(self,coord):
         """if there is an object on screen at coord return its symbol, else return None"""
-        for obj in self.objects:
-            symbol = obj[coord]
-            if symbol:
-                return symbol
+        #static objects never change, so only the dynamic objects need to be checked before using the index
+        state = tuple(layer.state() for z,layer in self._dynamic)
+        if state != self._index_state:
+            self._index = index_layers(self._layers)
+            self._index_state = state
+        obj = self._index.get((coord[0],coord[1]))
+        if obj is not None:
+            return obj[coord]
+ 
     @property
     def level(self):
-        return int(self._level)
+        return int(self._level.objects[1].text)
 
     @level.setter   
     def level(self,level):
@@ -72,7 +109,7 @@ class Screen():
  
     @property
     def score(self):
-        return int(self._score)
+        return int(self._score.objects[1].text)
 
     @score.setter
     def score(self,score):
@@ -82,41 +119,35 @@ class Screen():
     def move_block(self,direction): 
         """
             this function tries to move the falling block, 
-            it also handles the invalidmove and addtoheap exceptions
+            if the block moves down onto the heap or bottom of the board, it is added to the heap
             this function returns true if move was succesfull, and false if not
         """  
-        #try and move block to new location, check if that cause any exceptions
-        #to be throw, then fix those exceptions
-        try:
-            self.game_board.move_block(direction)
+        collision = self.game_board.try_move(direction)
+        if collision == Collision.NONE:
             return True
-        except Game_board.AddToHeap:    #if block should be added to heap
-            self.game_board.un_move_block(direction)    #undo the last move
+        if direction == Movement.DOWN and collision in Collision.LANDS:
             self.switch_blocks()    #add block to heap,and get next falling block
-            return False
-        except Game_board.InvalidMove:  #if move was invalid
-            self.game_board.un_move_block(direction)    #undo the last move
-            return False
+        return False
 
     def switch_blocks(self):
         """
             this function add the current falling block to the block heap
             turns the next_block into the next falling block
-            and randomly generates a new next_block
+            and shows the piece after it in next_block
         """  
         self.game_board.add_block_to_heap()
+        self.pieces.next_index()    #the piece in next_block is taken from the generator
         self.game_board.block = self.next_block.block
-        self.next_block.block = random_shape()
+        self.next_block.block = self.pieces.upcoming()[0]()
 
     def rotate_block(self):
-        try:
-            self.game_board.rotate_block()
-        except Game_board.InvalidMove:
-            self.game_board.un_rotate_block()
+        #rotating into anything is invalid, the block is only rotated if nothing is in the way
+        return self.game_board.try_rotate() == Collision.NONE
    
     def drop_block(self):
-        #move block down until there has been an invalid move
-        while self.move_block(Movement.DOWN): pass
+        #move block straight down to where it lands
+        if self.game_board.drop():
+            self.switch_blocks()
                           
     def get_full_rows(self):
         """returns a list of full rows in the block heap"""
@@ -130,22 +161,54 @@ class Screen():
         """removes full rows from block heap"""
         self.game_board.block_heap.adjust_rows(full_rows)
 
-    def print(self):
-        """this function prints the entire screen, to the terminal"""
-        self.clear()    #clear screen
-        #loop through the x,and y coords on screen and print each object on screen
-        for y in range(Dim.SCREEN_H,-1,-1):
-            for x in range(0,Dim.SCREEN_W):
-                print(self[x,y],end = ' ')  #print object at [x,y] coord
-            print()
-        print(Text.INSTRUCTIONS)    #print game intructions at bottom
+    def paint_static_frame(self):
+        """paint the static objects into the cached frame, and start the screens frame from it"""
+        self._static_frame = Frame(Dim.SCREEN_W,Dim.SCREEN_H + 1)
+        for z,layer in reversed(self._static):    #paint from the bottom layer up
+            self._static_frame.paint(layer.cells(),z)
+        self.frame = self._static_frame.copy()
 
+    def compose(self):
+        """
+            this function updates the screens frame and returns it
+            
+            each dynamic object reports the cells that changed since the last frame,
+            and only those cells are repainted, so a frame where nothing changed costs almost nothing
+        """
+        if self._static_frame is None:
+            self.paint_static_frame()
+        dirty = set()
+        for z,layer in self._dynamic:
+            dirty |= layer.dirty_cells()
+        self.dirty_count = len(dirty)
+
+        static = self._static_frame
+        rows = self.frame.rows
+        for x,y in dirty:
+            if not static.in_bounds(x,y):
+                continue
+            #the cell shows the top dynamic object at it, unless a static object is on top of that
+            depth = static.depth[y][x]
+            symbol = static.rows[y][x]
+            for z,layer in self._dynamic:
+                if z > depth:
+                    break
+                painted = layer.painted((x,y))
+                if painted:
+                    symbol = painted
+                    break
+            rows[y][x] = symbol
+        return self.frame
+
+    def print(self):
+        """
+            this function prints the screen to the terminal, with the game instructions at the bottom
+            only the cells that changed since the last print are written
+        """
+        self.renderer.render(self.compose(),Text.INSTRUCTIONS + '\n')
 
     def clear(self):
         """this function clears the terminal screen"""
-        if os.name == 'nt':
-            os.system('cls')
-        else:
-            os.system('clear')
+        self.renderer.clear()
 
 
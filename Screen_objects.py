@@ -10,10 +10,13 @@ This file also containts the Multi_object class, which is used to create objects
 The multi_object class is the parent class of the following classes
     Block_box,multi_line_text,game_board
 """
-from Settings import Dim,Movement,Exceptions,Symbols
+from Settings import Dim,Movement,Exceptions,Symbols,Collision
 
 import time
 import copy
+import bisect
+import functools
+import random
 
 
 class Screen_object():
@@ -22,13 +25,23 @@ class Screen_object():
     A screen object is described using by the following
         location: objects [x,y] coord on screen
         symbol: symbol printed to screen to represent the object
-        description: [x,y] coords independent of location used to describe the object
+        description: frozenset of (x,y) coords independent of location used to describe the object
+
+    screen objects keep the cells they covered the last time dirty_cells() was called, 
+    so the screen only has to repaint the cells that changed
+
+    screen objects use __slots__, so thousands of them can be kept in memory without a __dict__ each
     """ 
 
-    def __init__(self,location,description = [],symbol = None):
+    __slots__ = ('location','symbol','_description','_painted_cells','_painted_state')
+
+    def __init__(self,location,description = (),symbol = None):
         self.location = location
         self.symbol = symbol
-        self._description = description
+        self._description = frozenset(tuple(coord) for coord in description)
+        #{(x,y):symbol} of the cells covered, and the state the object was in, the last time dirty_cells() was called
+        self._painted_cells = {}
+        self._painted_state = None
 
     def __getitem__(self,coord):
         """
@@ -39,49 +52,91 @@ class Screen_object():
 
         #_description is location independent so
         #strip the coord of its location to check if its in _description
-        stripped_coord = [coord[0] - self.location[0],coord[1] - self.location[1]]
+        stripped_coord = (coord[0] - self.location[0],coord[1] - self.location[1])
         if stripped_coord in self._description:
             return self.symbol
 
     @property
     def description(self):
         """return the objects description relative to its location on hte screen"""
-        return [[x + self.location[0],y + self.location[1]] for x,y in self._description] 
+        x,y = self.location
+        return tuple((x + dx,y + dy) for dx,dy in self._description)
+
+    def cells(self):
+        """yields an (x,y,symbol) tuple for each coord the object covers on the screen, used to paint frames"""
+        if not self.symbol:
+            return
+        for x,y in self._description:
+            yield x + self.location[0],y + self.location[1],self.symbol
+
+    def layers(self):
+        """returns the screen objects that make up this object, in z order"""
+        return [self]
+
+    def state(self):
+        """returns a value that is different whenever the object looks different on the screen"""
+        return (self.symbol,self.location[0],self.location[1],len(self._description))
+
+    def dirty_cells(self):
+        """
+            returns the set of (x,y) coords on the screen that changed since the last time this was called
+            the objects cells are only looked at if its state has changed
+        """
+        state = self.state()
+        if state == self._painted_state:
+            return set()
+        old = self._painted_cells
+        new = {(x,y):symbol for x,y,symbol in self.cells()}
+        self._painted_cells = new
+        self._painted_state = state
+        return {coord for coord in old.keys() | new.keys() if old.get(coord) != new.get(coord)}
+
+    def painted(self,coord):
+        """returns the symbol painted at coord the last time dirty_cells() was called"""
+        return self._painted_cells.get(coord)
+
+@functools.lru_cache(maxsize = None)
+def gen_background_coords(height,width):
+    """
+        generate the description of a square background of height and width
+        descriptions are frozensets, so every background of the same size shares one
+    """
+    #description should be each coord inside 
+    #the square background 
+    return frozenset((x,y) for x in range(0,height) for y in range(0,width))
 
 class Background(Screen_object):
     """This class describes a square background"""
 
+    __slots__ = ()
+
     def __init__(self,height,width,location,symbol):
-        self.location = location 
-        self.symbol = symbol
-        self._description = []
-        
-        #description should be each coord inside 
-        #the square background 
-        for x in range(0,height):
-            for y in range(0,width):
-                self._description.append([x,y])
+        Screen_object.__init__(self,location,(),symbol)
+        self._description = gen_background_coords(height,width)
  
+@functools.lru_cache(maxsize = None)
 def gen_box_coords(height,width):
-    """ generate the description of a box of height and width"""
-    box = []
+    """ generate the description of a box of height and width, shared by every box of the same size"""
+    box = set()
     for y in range(0,height + 1):
-        box.append([0,y])
-        box.append([width,y])
+        box.add((0,y))
+        box.add((width,y))
     for x in range(0,width + 1):
-        box.append([x,0])
-        box.append([x,height])
-    return box
+        box.add((x,0))
+        box.add((x,height))
+    return frozenset(box)
  
 class Box(Screen_object):
     """ this class describes an empty box of height and width""" 
+
+    __slots__ = ('height','width')
+
     def __init__(self,height,width,location,symbol):
         self.height = height
         self.width = width
         
-        self.location = location
+        Screen_object.__init__(self,location,(),symbol)
         self._description = gen_box_coords(height,width)
-        self.symbol = symbol
 
 
 class Block(Screen_object):
@@ -93,12 +148,13 @@ class Block(Screen_object):
         blocks can be rotated and unrotated
     """
 
+    __slots__ = ('_shape',)
+
     def __init__(self,shape,location):
         self._shape = shape
         
-        self.location = location
+        Screen_object.__init__(self,location,(),shape.symbol)
         self._description = shape.description
-        self.symbol = shape.symbol
 
     @property
     def shape(self):
@@ -119,29 +175,82 @@ class Block(Screen_object):
         self._shape.un_rotate()
         self._description = self.shape.description
 
+    def state(self):
+        return (type(self._shape),self._shape.rotation,self.location[0],self.location[1])
+
+
+class Ghost_block(Screen_object):
+    """
+        this class describes the ghost of a game boards falling block,
+        drawn where the block would land if it was dropped
+    """
+
+    __slots__ = ('board',)
+
+    def __init__(self,board,symbol):
+        #location and description come from the board, so only the fields that are stored are set here
+        self.board = board
+        self.symbol = symbol
+        self._painted_cells = {}
+        self._painted_state = None
+
+    @property
+    def location(self):
+        return [self.board.block.location[0],self.board.landing()[0]]
+
+    @property
+    def _description(self):
+        return self.board.block.shape.description
+
+    def cells(self):
+        x,y = self.location
+        for dx,dy in self._description:
+            yield x + dx,y + dy,self.symbol
+
+    def __reduce__(self):
+        #location and description are properties here, so copies are made from the board instead of the slots
+        return (Ghost_block,(self.board,self.symbol))
+
+    def state(self):
+        #the ghost only moves when the block moves or the heap changes
+        return self.board.block.state() + (self.board.block_heap.version,)
+
+
+@functools.lru_cache(maxsize = None)
+def gen_text_coords(length):
+    """generate the description of a line of text length charecters long, a coord for each char"""
+    return frozenset((i,0) for i in range(length))
 
 class Text(Screen_object):
     """this class describes a single line of text on the screen"""
+
+    __slots__ = ('_text',)
     
     def __init__(self,text,location):
         self._text = text
         
-        self.location = location
-        #need a coord for each char in the text
-        self._description = [[i,0] for i in range(len(text))]
-
         #texts symbols are the charecters in text
-        self.symbol = text
+        Screen_object.__init__(self,location,(),text)
+        #need a coord for each char in the text
+        self._description = gen_text_coords(len(text))
 
     def __getitem__(self,coord):
         """
         text has it own getitem function, because there are multiple symbols
             used to represent the text on screen
         """  
-        stripped_coord = [coord[0] - self.location[0],coord[1] - self.location[1]]
+        stripped_coord = (coord[0] - self.location[0],coord[1] - self.location[1])
         symbol_index = stripped_coord[0]
         if stripped_coord in self._description:
             return self.symbol[symbol_index]
+
+    def cells(self):
+        """each charecter in the text is painted at its own coord"""
+        for x,y in self._description:
+            yield x + self.location[0],y + self.location[1],self.symbol[x]
+
+    def state(self):
+        return (self._text,self.location[0],self.location[1])
    
     @property
     def text(self):
@@ -150,10 +259,55 @@ class Text(Screen_object):
     @text.setter
     def text(self,new_text):
         """need to update symbol and description when setting text"""
-        
+        if new_text == self._text:  #nothing has changed
+            return
         self._text = new_text
         self.symbol = new_text
-        self._description = [[i,0] for i in range(len(new_text))] 
+        self._description = gen_text_coords(len(new_text))
+
+#heaps are hashed by xoring together a random key for each block in them (zobrist hashing),
+#the keys are picked from this seed, so the same heap always gets the same hash
+ZOBRIST_SEED = 0x7e7215
+ZOBRIST_WIDTH = 64  #widest heap that can be hashed
+
+@functools.lru_cache(maxsize = None)
+def zobrist_keys(y):
+    """returns the random 64 bit keys of row y of a heap, key x is xored into the hash when there is a block at [x,y]"""
+    rng = random.Random(ZOBRIST_SEED + y)
+    return tuple(rng.getrandbits(64) for x in range(ZOBRIST_WIDTH))
+
+@functools.lru_cache(maxsize = 1 << 16)
+def zobrist_row(y,mask):
+    """returns the hash of row y of a heap, where bit x of mask is set if there is a block at [x,y]"""
+    keys = zobrist_keys(y)
+    value = 0
+    while mask:
+        bit = mask & -mask
+        value ^= keys[bit.bit_length() - 1]
+        mask ^= bit
+    return value
+
+def zobrist_hash(rows,start = 0):
+    """returns the hash of the row masks in rows, starting from row start"""
+    value = 0
+    for y in range(start,len(rows)):
+        if rows[y]:
+            value ^= zobrist_row(y,rows[y])
+    return value
+
+def adjust_heights(heights,removed_rows,occupied):
+    """
+        update the column heights of a heap after removed_rows were removed from it
+        occupied(x,y) returns true if there is a block at [x,y] in the heap, after the rows were removed
+    """
+    removed_rows = sorted(removed_rows)
+    for x,height in enumerate(heights):
+        #every row removed below the top of the column moves the top down one
+        height -= bisect.bisect_left(removed_rows,height)
+        #if the top of the column was removed, the new top is the first block below it
+        while height > 0 and not occupied(x,height - 1):
+            height -= 1
+        heights[x] = height
 
 class Block_heap(Screen_object):
     """
@@ -167,48 +321,116 @@ class Block_heap(Screen_object):
     the block heap is described using a list of rows, on the tetris game board
         each element in the row is either a symbol representing the block at that 
         coordinate, or None if there is nothing at that coordinate  
+
+    the heap also keeps the following, updated as blocks are added and rows removed
+        heights: for each column, 1 + the row of the highest block in it, 0 if it is empty
+        row_counts: number of blocks in each row
+        version: incremented every time the heap changes, used to tell when cached values are stale
+        zobrist: hash of which cells have a block in them, updated as blocks are added and rows removed,
+            heaps with blocks in the same cells have the same hash, whatever symbols the blocks have
     """  
 
+    __slots__ = ('width','block_heap','heights','row_counts','version','zobrist')
+
     def __init__(self,width,location):
         self.width = width #width of the block heap
         self.block_heap = []
+        self.heights = [0]*width
+        self.row_counts = []
+        self.version = 0
+        self.zobrist = 0
         
-        self.location = location
-        self._description = []
-        self.symbol = None
+        Screen_object.__init__(self,location)
  
     def __setitem__(self,coord,symbol):
         """this function is used to add a symbol to the block heap at the [x,y] coord"""
         x,y = coord[0] - self.location[0],coord[1] - self.location[1]
+        if not 0 <= x < self.width or y < 0:  #coords off the heap are ignored
+            return
         #if y is not in the heap, we need to add a new empty row to the heap
         while y >= len(self.block_heap):
             self.block_heap.append(self.empty_row()) 
+            self.row_counts.append(0)
+        #keep the row counts, column heights and hash up to date
+        if self.block_heap[y][x] is None and symbol is not None:
+            self.row_counts[y] += 1
+            self.heights[x] = max(self.heights[x],y + 1)
+            self.zobrist ^= zobrist_keys(y)[x]
+        elif self.block_heap[y][x] is not None and symbol is None:
+            self.row_counts[y] -= 1
+            self.zobrist ^= zobrist_keys(y)[x]
         #then we can add the symbol to the correct row and column in the heap
         self.block_heap[y][x] = symbol 
+        if symbol is None:
+            adjust_heights(self.heights,[],lambda x,y: self.block_heap[y][x] is not None)
+        self.version += 1
                              
     def __getitem__(self,coord):
         """this function returns the symbol at the coord on the screen, or 
            returns none if there is no block_heap located at that coord""" 
         x,y = coord[0] - self.location[0],coord[1] - self.location[1]
+        if x < 0 or y < 0:  #negative indexes would wrap around to the other side of the heap
+            return None
         try: 
             return self.block_heap[y][x]
         except IndexError: 
             return None
+
+    def state(self):
+        return self.version
+
+    def collides(self,coords):
+        """returns true if any of the [x,y] coords on the screen are already in the heap"""
+        return any(self[coord] for coord in coords)
+
+    def collides_block(self,block):
+        """returns true if block overlaps the heap"""
+        return self.collides(block.description)
+
+    def collides_rotation(self,rotation,x,y):
+        """returns true if a shape in rotation, located at [x,y] on the screen, would overlap the heap"""
+        return self.collides([[x + dx,y + dy] for dx,dy in rotation.coords])
+
+    def cells(self):
+        """only the coords in the heap with a block in them are painted"""
+        for y,row in enumerate(self.block_heap):
+            for x,symbol in enumerate(row):
+                if symbol:
+                    yield x + self.location[0],y + self.location[1],symbol
  
     def get_full_rows(self):
         """this function returns a list of indexes of each full row in the heap"""
-        #a row is full if None is not in the row
-        return [self.block_heap.index(row) for row in self.block_heap if None not in row]         
+        #a row is full if every column in it has a block
+        return [y for y,count in enumerate(self.row_counts) if count == self.width]         
     
     def set_full_rows(self,full_rows):
         """this function replaces each full row with a row of symbols representing a full row
             it is used to animate a row being removed"""
+        if not full_rows:   #nothing changes, so cached values dont need to be thrown away
+            return
         for row in full_rows:
             self.block_heap[row] = self.full_row()
+        #every cell in the rows still has a block in it, so the hash stays the same
+        self.version += 1
 
     def adjust_rows(self,removed_rows):
         """this function removes the full rows from the heap"""
-        [self.block_heap.pop(row) for row in removed_rows]
+        if not removed_rows:
+            return
+        #only the rows from the lowest removed row up move, so only their part of the hash is redone
+        start = min(removed_rows)
+        self.zobrist ^= zobrist_hash(self.row_masks(),start)
+        #pop from the top down, so popping a row doesnt shift the index of the rows still to be removed
+        for row in sorted(removed_rows,reverse = True):
+            self.block_heap.pop(row)
+            self.row_counts.pop(row)
+        adjust_heights(self.heights,removed_rows,lambda x,y: self.block_heap[y][x] is not None)
+        self.zobrist ^= zobrist_hash(self.row_masks(),start)
+        self.version += 1
+
+    def row_masks(self):
+        """returns each row of the heap as a mask, where bit x is set if there is a block in column x"""
+        return [sum(1 << x for x,symbol in enumerate(row) if symbol is not None) for row in self.block_heap]
 
     def empty_row(self):
         """this funciton generates an empty row, filled with None"""
@@ -219,25 +441,265 @@ class Block_heap(Screen_object):
         return [Symbols.FULL_ROW for x in range(0,self.width)]
 
 
+class Bit_block_heap(Screen_object):
+    """
+    this class describes a block heap stored as bitmasks, it can be used in place of Block_heap
+    
+    each row of the heap is stored as an int, where bit x is set if there is a block in column x
+    the symbols used to print the heap are stored in a parallel list of bytearrays, 
+        with 0 where there is no block
+
+    this lets collisions be checked with a single and against a row mask, 
+        and a full row is just a row equal to full_mask
+
+    heights,row_counts,version and zobrist are kept the same way as in Block_heap
+    """
+
+    __slots__ = ('width','full_mask','rows','symbols','heights','row_counts','version','zobrist')
+
+    def __init__(self,width,location):
+        self.width = width
+        self.full_mask = (1 << width) - 1
+        self.rows = []
+        self.symbols = []
+        self.heights = [0]*width
+        self.row_counts = []
+        self.version = 0
+        self.zobrist = 0
+
+        Screen_object.__init__(self,location)
+
+    def __setitem__(self,coord,symbol):
+        """this function is used to add a symbol to the block heap at the [x,y] coord"""
+        x,y = coord[0] - self.location[0],coord[1] - self.location[1]
+        if not 0 <= x < self.width or y < 0:
+            return
+        while y >= len(self.rows):
+            self.rows.append(0)
+            self.symbols.append(bytearray(self.width))
+            self.row_counts.append(0)
+        occupied = self.rows[y] >> x & 1
+        if symbol is None:  #None clears the cell, the same as in Block_heap
+            if occupied:
+                self.row_counts[y] -= 1
+                self.zobrist ^= zobrist_keys(y)[x]
+                self.rows[y] &= ~(1 << x)
+                self.symbols[y][x] = 0
+                adjust_heights(self.heights,[],lambda x,y: self.rows[y] >> x & 1)
+            self.version += 1
+            return
+        if not occupied:
+            self.row_counts[y] += 1
+            self.heights[x] = max(self.heights[x],y + 1)
+            self.zobrist ^= zobrist_keys(y)[x]
+        self.rows[y] |= 1 << x
+        self.symbols[y][x] = ord(symbol)
+        self.version += 1
+
+    def __getitem__(self,coord):
+        x,y = coord[0] - self.location[0],coord[1] - self.location[1]
+        if 0 <= x < self.width and 0 <= y < len(self.rows) and self.rows[y] >> x & 1:
+            return chr(self.symbols[y][x])
+
+    def state(self):
+        return self.version
+
+    @property
+    def block_heap(self):
+        """the heap as a list of rows of symbols or None, the same as Block_heap.block_heap"""
+        return [[chr(symbol) if symbol else None for symbol in row] for row in self.symbols]
+
+    def cells(self):
+        for y,row in enumerate(self.symbols):
+            for x,symbol in enumerate(row):
+                if symbol:
+                    yield x + self.location[0],y + self.location[1],chr(symbol)
+
+    def row_masks(self):
+        """returns each row of the heap as a mask, the same as Block_heap.row_masks"""
+        return self.rows[:]
+
+    def masks_for(self,coords):
+        """turns a list of [x,y] coords on the screen into a dict of {heap row:mask}"""
+        masks = {}
+        for x,y in coords:
+            x,y = x - self.location[0],y - self.location[1]
+            if 0 <= x < self.width and y >= 0:
+                masks[y] = masks.get(y,0) | 1 << x
+        return masks
+
+    def collides_masks(self,masks):
+        """returns true if any of the {heap row:mask} masks overlap the heap"""
+        rows = self.rows
+        height = len(rows)
+        for y,mask in masks.items():
+            if y < height and rows[y] & mask:
+                return True
+        return False
+
+    def collides(self,coords):
+        return self.collides_masks(self.masks_for(coords))
+
+    def collides_block(self,block):
+        """returns true if block overlaps the heap"""
+        return self.collides_rotation(block.shape.state,block.location[0],block.location[1])
+
+    def collides_rotation(self,rotation,x,y):
+        """
+            returns true if a shape in rotation, located at [x,y] on the screen, would overlap the heap,
+            using the precomputed masks of the rotation
+        """
+        x = x - self.location[0] + rotation.left
+        y = y - self.location[1]
+        rows = self.rows
+        height = len(rows)
+        for dy,mask in rotation.masks:
+            if 0 <= y + dy < height:
+                #bits shifted past either side of the heap can never overlap it
+                if rows[y + dy] & (mask << x if x >= 0 else mask >> -x):
+                    return True
+        return False
+
+    def get_full_rows(self):
+        """returns the index of each full row in the heap"""
+        full_mask = self.full_mask
+        return [y for y,row in enumerate(self.rows) if row == full_mask]
+
+    def set_full_rows(self,full_rows):
+        """replace the symbols in the full rows with the full row symbol, used to animate a row being removed"""
+        if not full_rows:
+            return
+        for y in full_rows:
+            self.symbols[y][:] = Symbols.FULL_ROW.encode() * self.width
+        #only the symbols change, so the hash stays the same
+        self.version += 1
+
+    def adjust_rows(self,removed_rows):
+        """removes the full rows from the heap"""
+        if not removed_rows:
+            return
+        start = min(removed_rows)
+        self.zobrist ^= zobrist_hash(self.rows,start)
+        for y in sorted(removed_rows,reverse = True):
+            del self.rows[y:y + 1]
+            del self.symbols[y:y + 1]
+            del self.row_counts[y:y + 1]
+        self.zobrist ^= zobrist_hash(self.rows,start)
+        #full rows have a block in every column, so every column moves down by the number of rows removed,
+        #only the columns whose top block was in the highest removed row have to be looked down for their new top
+        top = max(removed_rows) + 1
+        count = len(removed_rows)
+        heights = self.heights
+        moved = 0
+        for x,height in enumerate(heights):
+            if height == top:
+                moved |= 1 << x
+            heights[x] = height - count
+        if moved:
+            self.find_heights(moved,top - count)
+        self.version += 1
+
+    def restore_rows(self,rows,count,symbols,offset,zobrist):
+        """
+            replace the heap with the first count row masks in rows, and their symbols, which are held one row after 
+            the other in the buffer symbols starting at offset, zobrist is the hash of the rows
+            the heaps lists and bytearrays are filled in place, rows and bytearrays are only added if the heap grew
+        """
+        width = self.width
+        heap_rows,heap_symbols,row_counts = self.rows,self.symbols,self.row_counts
+        del heap_rows[count:],heap_symbols[count:],row_counts[count:]
+        while len(heap_rows) < count:
+            heap_rows.append(0)
+            heap_symbols.append(bytearray(width))
+            row_counts.append(0)
+        for y in range(count):
+            row = rows[y]
+            heap_rows[y] = row
+            row_counts[y] = row.bit_count()
+            start = offset + y*width
+            heap_symbols[y][:] = symbols[start:start + width]
+        self.zobrist = zobrist
+        self.find_heights()
+        self.version += 1
+
+    def find_heights(self,columns = None,top = None):
+        """
+            find the height of the columns set in the mask columns (every column if None), by looking down the rows 
+            from row top - 1 (the top of the heap if None) until every column has been found
+        """
+        heights = self.heights
+        remaining = self.full_mask if columns is None else columns  #columns that havent been found yet
+        top = len(self.rows) if top is None else top
+        for y in range(top - 1,-1,-1):
+            found = self.rows[y] & remaining
+            if found:
+                remaining &= ~found
+                while found:    #loop through only the set bits
+                    bit = found & -found
+                    heights[bit.bit_length() - 1] = y + 1
+                    found ^= bit
+                if not remaining:
+                    return
+        for x in range(self.width):
+            if remaining >> x & 1:
+                heights[x] = 0
+
+
+
+def index_layers(layers):
+    """
+        returns a {(x,y):screen object} dict, of the first object in layers 
+        that has a symbol at each coord on the screen
+    """
+    index = {}
+    for layer in reversed(layers):  #earlier layers overwrite later ones
+        for x,y,symbol in layer.cells():
+            if symbol:
+                index[(x,y)] = layer
+    return index
 
 class Multi_object():
     """
     A multi_object has 
         location:objects location on screen
         object: a list of all screen_objects that make up the multi_object
+
+    multi_objects keep an index of which object is at each coord, 
+    it is only rebuilt when the state of one of the objects changes
     """
+
+    _index = None
+    _index_state = None
     
     def __init__(self,location):
         self.location = location
         self.objects = []
 
     def __getitem__(self,coord):
-        #loop through all objects until one has a symbol 
-        #at coord, then return that symbol
+        #look up the object at coord in the index, then return its symbol
+        obj = self.index().get((coord[0],coord[1]))
+        if obj is not None:
+            return obj[coord]
+
+    def index(self):
+        """returns a {(x,y):screen object} dict of the object shown at each coord"""
+        layers = self.layers()
+        state = tuple(layer.state() for layer in layers)
+        if state != self._index_state:
+            self._index = index_layers(layers)
+            self._index_state = state
+        return self._index
+
+    def layers(self):
+        """returns the screen objects that make up the multi_object, in z order"""
+        return [layer for obj in self.objects for layer in obj.layers()]
+
+    def dirty_cells(self):
+        """returns the set of (x,y) coords on the screen that changed in any of the objects"""
+        dirty = set()
         for obj in self.objects:
-            symbol = obj[coord]
-            if symbol:
-                return symbol
+            dirty |= obj.dirty_cells()
+        return dirty
 
 class Block_box(Multi_object):
     """
@@ -304,10 +766,15 @@ class Game_board(Multi_object):
             Boarder: box displayed around the game board
             Block: falling block that the player controles
             block_heap: the games block heap
+            ghost: ghost of the block where it would land, None if no ghost is shown
     """
     
-    def __init__(self,shape,height,width,location,boarder_symbol):
-        """at initialization place all objects at the correct place relative to location"""
+    def __init__(self,shape,height,width,location,boarder_symbol,heap_type = Block_heap,ghost_symbol = None):
+        """
+            at initialization place all objects at the correct place relative to location
+            heap_type is the class used for the block heap, Block_heap or Bit_block_heap
+            a ghost is shown with ghost_symbol, if it is given
+        """
         self.location = location
         
         self.width = width
@@ -321,10 +788,19 @@ class Game_board(Multi_object):
         self._block_start_location = [int(width/2) + location[0],height + location[1] + 1]
         self._block = Block(shape,self.block_start_location)
 
-        self.block_heap = Block_heap(width,location)
+        self.block_heap = heap_type(width,location)
  
         self.objects = [self.boarder,self._block,self.block_heap] 
 
+        self.ghost = None
+        if ghost_symbol:
+            self.ghost = Ghost_block(self,ghost_symbol)
+            self.objects.append(self.ghost)
+
+        #landing rows found from the heaps column heights, cached by (rotation,x) until the heap changes
+        self._landing_cache = {}
+        self._landing_version = None
+
     @property 
     def block_start_location(self):
         return copy.copy(self._block_start_location)
@@ -339,6 +815,109 @@ class Game_board(Multi_object):
         self._block.shape = block.shape
         self._block.location = self.block_start_location
  
+    def test_placement(self,piece,rotation,x,y):
+        """
+            returns a Collision describing what a piece (a Shape class or shape) in its rotation index rotation,
+            located at [x,y] on the screen, would hit
+            nothing is changed, so this can be used to test moves before doing them
+        """
+        state = piece.ROTATIONS[rotation]
+        board_bottom = self.boarder_location[1]
+        board_top = board_bottom + self.boarder_h
+        if y + state.bottom <= board_bottom:    #the block is at the bottom of the board
+            return Collision.FLOOR
+        if self.block_heap.collides_rotation(state,x,y):
+            return Collision.HEAP
+        left = self.boarder_location[0]
+        right = left + self.boarder_w
+        #the top row of the boarder is left open, so blocks can enter the board
+        for dx,dy in state.coords:
+            if (x + dx == left or x + dx == right) and y + dy < board_top:
+                return Collision.BOARDER
+        return Collision.NONE
+
+    def try_move(self,direction):
+        """move the block only if the move is valid, returns the Collision the move would cause, Collision.NONE if it was done"""
+        shape = self._block.shape
+        location = self._block.location
+        x,y = location[0] + Movement.MOVES[direction][0],location[1] + Movement.MOVES[direction][1]
+        collision = self.test_placement(shape,shape.rotation,x,y)
+        if collision == Collision.NONE:
+            location[0],location[1] = x,y
+        return collision
+
+    def try_rotate(self):
+        """rotate the block only if the rotation is valid, returns the Collision the rotation would cause"""
+        shape = self._block.shape
+        rotation = (shape.rotation + 1) % len(shape.ROTATIONS)
+        collision = self.test_placement(shape,rotation,*self._block.location)
+        if collision == Collision.NONE:
+            self._block.rotate()
+        return collision
+
+    def surface_landing(self,piece,rotation,x,y):
+        """
+            returns the y a piece in rotation, located at [x,y] on the screen, lands on when dropped,
+            found from the heaps column heights in time proportional to the pieces width
+            returns None if the piece is below the top of the heap in any of its columns, 
+            or off the side of the heap, where the column heights cant be used
+        """
+        heap = self.block_heap
+        state = piece.ROTATIONS[rotation]
+        heights = heap.heights
+        heap_x,heap_y = x - heap.location[0],y - heap.location[1]
+        for dx,bottom in state.column_bottoms:
+            column = heap_x + dx
+            if not 0 <= column < heap.width or heap_y + bottom < heights[column]:
+                return None
+
+        if heap.version != self._landing_version:
+            self._landing_cache.clear()
+            self._landing_version = heap.version
+        key = (state,x)
+        landing = self._landing_cache.get(key)
+        if landing is None:
+            #the piece lands on the highest column under it, or on the bottom of the board
+            landing = max(-state.bottom,max(heights[heap_x + dx] - bottom for dx,bottom in state.column_bottoms))
+            landing += heap.location[1]
+            self._landing_cache[key] = landing
+        return landing
+
+    def landing(self):
+        """
+            returns (y,collision), the lowest y the block can fall to from where it is, 
+            and the Collision stopping it from falling further
+        """
+        shape = self._block.shape
+        x,y = self._block.location
+        landing = self.surface_landing(shape,shape.rotation,x,y)
+        if landing is not None:
+            if landing + shape.state.bottom - 1 <= self.boarder_location[1]:
+                return landing,Collision.FLOOR
+            return landing,Collision.HEAP
+        #step the block down a row at a time when it is under the top of the heap
+        while True:
+            collision = self.test_placement(shape,shape.rotation,x,y - 1)
+            if collision != Collision.NONE:
+                return y,collision
+            y -= 1
+
+    def drop_distance(self):
+        """number of rows the block would fall if it was dropped"""
+        return self._block.location[1] - self.landing()[0]
+
+    def drop(self):
+        """
+            move the block straight to where it lands, 
+            returns true if it should be added to the heap, false if the boarder stopped it
+        """
+        y,collision = self.landing()
+        self._block.location[1] = y
+        return collision in Collision.LANDS
+
+    #move_block,rotate_block and check_move change the block first, then throw exceptions if the move was invalid, 
+    #they are kept for code using them, the try_ functions above dont change anything for an invalid move
+
     def move_block(self,direction):
         """move the block by changing its location, then check if that was a valid move"""
         self._block.location[1] += Movement.MOVES[direction][1]
@@ -360,8 +939,11 @@ class Game_board(Multi_object):
     def add_block_to_heap(self):
         board_top = self.boarder_location[1] + self.boarder_h
        
-        #loop throught the blocks description and add each coord to the block_heap 
-        for x,y in self.block.description:
+        #add the blocks cells in the order of its rotations coords, not the description, which is a set with no fixed order
+        #if the game is lost partway through, the cells already added are always the same ones, the same as in Batch_engine
+        left,bottom = self.block.location
+        for dx,dy in self.block.shape.state.coords:
+            x,y = left + dx,bottom + dy
             if y == board_top:
                 raise Exceptions.GameOver
             self.block_heap[[x,y]] = self.block.symbol
@@ -371,20 +953,15 @@ class Game_board(Multi_object):
                 move was invalid, or 
                 block shoulb be added to the block_heap
         """
-
-        board_top = self.boarder_location[1] + self.boarder_h
-        board_bottom = self.boarder_location[1]
-
-        #loop throught the blocks description and see is there are any other objects at that coord
-        for x,y in self.block.description:
-            if y == board_bottom: #add to heap if block is at the bottom of the board
-                raise self.AddToHeap
-            elif self.block_heap[[x,y]]:    #if there is a conflict with the block_heap
-                if direction == Movement.DOWN:  #only add block to heap if it was moving down
-                    raise self.AddToHeap
-                raise self.InvalidMove      #else move is invalid
-            elif self.boarder[[x,y]] and y != board_top:    #any other boarder conflicat and move is invalid
-                raise self.InvalidMove    
+        shape = self._block.shape
+        collision = self.test_placement(shape,shape.rotation,*self._block.location)
+        if collision == Collision.NONE:
+            return
+        if collision == Collision.FLOOR:    #add to heap if block is at the bottom of the board
+            raise self.AddToHeap
+        if collision == Collision.HEAP and direction == Movement.DOWN:  #only add block to heap if it was moving down
+            raise self.AddToHeap
+        raise self.InvalidMove  #else move is invalid
  
     class InvalidMove(BaseException): pass
     
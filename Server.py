@@ -0,0 +1,442 @@
+"""
+this file contains the game server, which hosts many games at once in one process, played over telnet
+
+every connection gets a session, which goes through the same states as Game, the welcome prompt,
+playing, and game over, and is run as an asyncio task reading the players keys
+gravity ticks, removing full rows and drawing frames are not done by threads or a timer for each session,
+they are all put on one timer wheel shared by every session, run by a single task
+
+output is written without waiting for the player to read it, a session that hasnt read its
+last frames yet has its next frames skipped, so a slow connection never holds the server up
+
+to run the server, and play on it:
+    python3 Server.py --port 2323
+    telnet localhost 2323
+"""
+from Engine import Engine
+from Game import key_action
+from Keyboard import split_keys
+from Renderer import Renderer
+from Scheduler import MAX_CATCH_UP
+from Settings import Text,Input,Game_settings
+
+import argparse
+import asyncio
+import collections
+import itertools
+import time
+
+#telnet commands, the server asks the client to send each key as it is pressed, and not echo it
+IAC,DONT,DO,WONT,WILL,SB,SE = 255,254,253,252,251,250,240
+ECHO,SUPPRESS_GO_AHEAD = 1,3
+CHARACTER_MODE = bytes([IAC,WILL,ECHO,IAC,WILL,SUPPRESS_GO_AHEAD])
+
+#telnet sends enter as \r\n or \r\0, these are ignored when they come in as keys
+IGNORED_KEYS = ('\r','\n','\0')
+
+#seconds between the slots of the timer wheel, and number of slots in it
+WHEEL_RESOLUTION = .005
+WHEEL_SLOTS = 512
+
+#frames arent written to a connection with more than this many bytes still waiting to be sent
+MAX_WRITE_BUFFER = 64*1024
+
+#number of tick lags kept for each session
+LAG_LOG_SIZE = 1000
+
+#bytes read from a connection at once
+READ_SIZE = 1024
+
+def telnet_text(data):
+    """strip the telnet commands out of data read from a connection, returns the text that was typed"""
+    text = bytearray()
+    i = 0
+    while i < len(data):
+        if data[i] != IAC:
+            text.append(data[i])
+            i += 1
+            continue
+        command = data[i + 1] if i + 1 < len(data) else None
+        if command == IAC:  #an escaped 255 byte
+            text.append(IAC)
+            i += 2
+        elif command in (WILL,WONT,DO,DONT):
+            i += 3
+        elif command == SB:     #subnegotiations run until IAC SE
+            end = data.find(bytes([IAC,SE]),i)
+            i = len(data) if end < 0 else end + 2
+        else:
+            i += 2
+    return text.decode(errors = 'ignore')
+
+
+class Timer_wheel():
+    """
+    The timer wheel class calls callbacks at deadlines on the monotonic clock, using one asyncio task for every timer
+
+    time is split into steps of resolution seconds, and timers are kept in a ring of slots, one for each step,
+    the task wakes up once a step and only looks at the timers in that steps slot,
+    timers more than one turn of the wheel away stay in their slot until the wheel comes round to them on the right turn
+
+    callbacks are called with how late they were called, in seconds
+
+    a timer wheel is described by the following
+        resolution: seconds between slots
+        slots: list of lists of (deadline,callback) timers
+        timers: number of timers waiting
+        fired: number of timers that have been called
+    """
+
+    def __init__(self,resolution = WHEEL_RESOLUTION,slots = WHEEL_SLOTS):
+        self.resolution = resolution
+        self.slots = [[] for i in range(slots)]
+        self.timers = 0
+        self.fired = 0
+        self._step = int(time.monotonic() / resolution)  #the next step to be run
+        self._wake = None   #event set when a timer is added to an empty wheel
+
+    def schedule(self,deadline,callback):
+        """call callback(lag) at the monotonic time deadline"""
+        if not self.timers:     #the wheel stops turning when it is empty, so it starts again from now
+            self._step = max(self._step,int(time.monotonic() / self.resolution))
+        #timers that are already due go in the next slot to be run
+        step = max(int(deadline / self.resolution),self._step)
+        self.slots[step % len(self.slots)].append((deadline,callback))
+        self.timers += 1
+        if self._wake is not None:
+            self._wake.set()
+
+    def call_later(self,delay,callback):
+        self.schedule(time.monotonic() + delay,callback)
+
+    def run_step(self,now):
+        """call the timers in the slot of the next step, if their deadline is before the end of the step"""
+        end = (self._step + 1)*self.resolution
+        slot = self.slots[self._step % len(self.slots)]
+        self._step += 1
+        if not slot:
+            return
+        due = [timer for timer in slot if timer[0] < end]
+        if len(due) < len(slot):    #timers for a later turn of the wheel stay where they are
+            slot[:] = [timer for timer in slot if timer[0] >= end]
+        else:
+            slot.clear()
+        self.timers -= len(due)
+        for deadline,callback in due:
+            self.fired += 1
+            callback(max(now - deadline,0))
+
+    async def run(self):
+        """run the wheel forever"""
+        self._wake = asyncio.Event()
+        while True:
+            if not self.timers:     #sleep until a timer is added, instead of turning an empty wheel
+                self._wake.clear()
+                await self._wake.wait()
+            now = time.monotonic()
+            #run every step that has ended, then sleep until the end of the next one
+            while (self._step + 1)*self.resolution <= now:
+                self.run_step(now)
+            await asyncio.sleep((self._step + 1)*self.resolution - now)
+
+
+class Connection_stream():
+    """a stream the renderer can write to, that writes to an asyncio connection without waiting"""
+
+    def __init__(self,writer):
+        self.writer = writer
+
+    def write(self,text):
+        self.writer.write(text.encode())
+
+    def flush(self):
+        pass
+
+
+class Session():
+    """
+    The session class runs the game of one connection to the server
+
+    a session starts at the welcome prompt, plays a game when p is pressed, and is closed when the game is over,
+    its keys are read by run(), which is the sessions task, everything else is called by the servers timer wheel
+
+    a session is described by the following
+        id: number of the session on the server
+        reader,writer: the asyncio streams of the connection
+        state: PROMPT,PLAYING or OVER
+        engine: the engine running the sessions game, None until it is started
+        renderer: writes frames to the connection, with telnet line endings
+        ticks: number of gravity ticks done
+        lag_log: how late each of the last gravity ticks was, in seconds
+        max_lag: latest a gravity tick has been
+        skipped_frames: frames not written because the connection hadnt sent the earlier ones yet
+    """
+
+    PROMPT,PLAYING,OVER = 'prompt','playing','over'
+
+    def __init__(self,server,id,reader,writer):
+        self.server = server
+        self.id = id
+        self.reader = reader
+        self.writer = writer
+        self.state = self.PROMPT
+        self.engine = None
+        self.renderer = Renderer(Connection_stream(writer),'\r\n')
+        self.ticks = 0
+        self.lag_log = collections.deque(maxlen = LAG_LOG_SIZE)
+        self.max_lag = 0
+        self.skipped_frames = 0
+
+        self._next_tick = None
+        self._full_rows = []    #full rows being shown before they are removed
+        self._frame_due = False     #true if a frame is waiting on the timer wheel
+        self._last_frame = 0
+
+    @property
+    def average_lag(self):
+        return sum(self.lag_log) / len(self.lag_log) if self.lag_log else 0
+
+    @property
+    def score(self):
+        return self.engine.score if self.engine else 0
+
+    def write(self,text):
+        self.writer.write(text.replace('\n','\r\n').encode())
+
+    async def run(self):
+        """read the connections keys until the session is over or the connection is closed"""
+        self.writer.write(CHARACTER_MODE)
+        self.renderer.clear()
+        self.write(Text.WELCOME_MESSAGE + '\n' + Text.STARTING_PROMPT)
+        try:
+            while self.state != self.OVER:
+                data = await self.reader.read(READ_SIZE)
+                if not data:
+                    break
+                for key in split_keys(telnet_text(data)):
+                    if key not in IGNORED_KEYS:
+                        self.press(key)
+        except ConnectionError:
+            pass
+        finally:
+            self.close()
+
+    def press(self,key):
+        """do what key does in the sessions state"""
+        if self.state == self.PROMPT:
+            if key in Input.PLAY:
+                self.start()
+            elif key in Input.QUIT:
+                self.close()
+            else:   #bad input, reprompt the player
+                self.write('\n' + Text.BAD_INPUT + '\n' + Text.STARTING_PROMPT)
+        elif self.state == self.PLAYING:
+            action = key_action(key)
+            if action is not None:  #input is applied and drawn straight away
+                self.engine.step(action)
+                if self.engine.game_over:
+                    self.end()
+                    return
+                self.request_frame()
+            elif key in Input.QUIT:
+                self.end()
+
+    def start(self):
+        """start a game, at the servers starting level"""
+        self.state = self.PLAYING
+        self.engine = Engine()
+        if self.server.level:
+            self.engine.start_at_level(self.server.level)
+        self.engine.screen.renderer = self.renderer
+        self.renderer.clear()
+        self._next_tick = time.monotonic() + self.engine.game_speed
+        self.server.wheel.schedule(self._next_tick,self.tick)
+        self.request_frame()
+
+    def tick(self,lag):
+        """do one gravity tick, the same way Scheduler.tick does, and schedule the next one"""
+        if self.state != self.PLAYING:
+            return
+        self.lag_log.append(lag)
+        self.max_lag = max(self.max_lag,lag)
+        self.server.lag_log.append(lag)
+        self.server.max_lag = max(self.server.max_lag,lag)
+        self.ticks += 1
+
+        engine = self.engine
+        if self._full_rows:     #rows from the last tick havent been removed yet
+            engine.remove_rows(self._full_rows)
+            self._full_rows = []
+        engine.fall()
+        if engine.game_over:
+            self.end()
+            return
+        #full rows are shown for part of a tick before they are removed
+        self._full_rows = engine.mark_full_rows()
+        if self._full_rows:
+            self.server.wheel.call_later(engine.game_speed*Game_settings.CLEAR_TIME,
+                                         lambda lag,tick = self.ticks: self.clear(tick))
+
+        #ticks are scheduled from when the last one should have happened, skipping them if the session falls too far behind
+        self._next_tick += engine.game_speed
+        now = time.monotonic()
+        if now - self._next_tick > MAX_CATCH_UP*engine.game_speed:
+            self._next_tick += int((now - self._next_tick) / engine.game_speed)*engine.game_speed
+        self.server.wheel.schedule(self._next_tick,self.tick)
+        self.request_frame()
+
+    def clear(self,tick):
+        """remove the full rows marked at tick, if the next tick hasnt removed them already"""
+        if self.state == self.PLAYING and tick == self.ticks and self._full_rows:
+            self.engine.remove_rows(self._full_rows)
+            self._full_rows = []
+            self.request_frame()
+
+    def request_frame(self):
+        """draw a frame as soon as the frame rate allows, frames requested before it is drawn are drawn with it"""
+        if self._frame_due:
+            return
+        self._frame_due = True
+        self.server.wheel.schedule(self._last_frame + 1 / Game_settings.FRAME_RATE,self.draw)
+
+    def draw(self,lag = 0):
+        self._frame_due = False
+        if self.state != self.PLAYING:
+            return
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            #the connection is behind, the frame is skipped and tried again at the next frame
+            self.skipped_frames += 1
+            self._last_frame = time.monotonic()
+            self.request_frame()
+            return
+        self._last_frame = time.monotonic()
+        self.engine.screen.print()
+
+    def end(self):
+        """the game is over, draw the last frame and close the session"""
+        if self.state != self.PLAYING:
+            return
+        self.engine.screen.print()
+        self.write(Text.GAME_OVER + '\n' + Text.SCORE + str(self.engine.score) + '\n')
+        self.close()
+
+    def close(self):
+        if self.state == self.OVER:
+            return
+        self.state = self.OVER
+        self.server.finished(self)
+        self.writer.close()
+
+    def stats(self):
+        return {
+            'state':self.state,
+            'score':self.score,
+            'ticks':self.ticks,
+            'max_lag':self.max_lag,
+            'average_lag':self.average_lag,
+            'skipped_frames':self.skipped_frames}
+
+
+class Server():
+    """
+    The server class accepts telnet connections, and runs a session for each one
+
+    a server is described by the following
+        level: level games on the server start at
+        wheel: timer wheel shared by every session
+        sessions: {id:session} of the open sessions
+        lag_log: how late each of the last gravity ticks of every session was, in seconds
+        max_lag: latest any sessions gravity tick has been
+        sessions_started,games_finished: number of sessions started and games finished since the server started
+    """
+
+    def __init__(self,level = 0):
+        self.level = level
+        self.wheel = Timer_wheel()
+        self.sessions = {}
+        self.lag_log = collections.deque(maxlen = LAG_LOG_SIZE*10)
+        self.max_lag = 0
+        self.sessions_started = 0
+        self.games_finished = 0
+        self._ids = itertools.count()
+        self._server = None
+        self._tasks = []
+
+    async def handle(self,reader,writer):
+        """run the session of a new connection"""
+        session = Session(self,next(self._ids),reader,writer)
+        self.sessions[session.id] = session
+        self.sessions_started += 1
+        await session.run()
+
+    def finished(self,session):
+        """called when a session closes"""
+        self.sessions.pop(session.id,None)
+        if session.engine is not None:
+            self.games_finished += 1
+
+    async def start(self,host = 'localhost',port = 2323):
+        """start accepting connections, returns the port the server is listening on"""
+        self._server = await asyncio.start_server(self.handle,host,port)
+        self._tasks.append(asyncio.ensure_future(self.wheel.run()))
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for session in list(self.sessions.values()):
+            session.close()
+        self._server.close()
+        await self._server.wait_closed()
+        for task in self._tasks:
+            task.cancel()
+
+    def lag_percentile(self,percent):
+        """returns the tick lag that percent of the servers logged ticks were at or under"""
+        if not self.lag_log:
+            return 0
+        lags = sorted(self.lag_log)
+        return lags[min(len(lags) - 1,int(len(lags)*percent/100))]
+
+    def stats(self):
+        playing = [session for session in self.sessions.values() if session.state == Session.PLAYING]
+        return {
+            'sessions':len(self.sessions),
+            'playing':len(playing),
+            'sessions_started':self.sessions_started,
+            'games_finished':self.games_finished,
+            'timers':self.wheel.timers,
+            'max_lag':self.max_lag,
+            'p99_lag':self.lag_percentile(99),
+            'average_lag':sum(self.lag_log) / len(self.lag_log) if self.lag_log else 0}
+
+    async def report(self,interval,worst = 5):
+        """print the servers stats every interval seconds, with the sessions whose ticks were latest"""
+        while True:
+            await asyncio.sleep(interval)
+            print('{sessions} sessions ({playing} playing), {games_finished} games finished, '
+                  'tick lag: p99 {p99_lag:.4f}s, average {average_lag:.4f}s, max {max_lag:.4f}s'.format(**self.stats()))
+            for session in sorted(self.sessions.values(),key = lambda session: session.max_lag,reverse = True)[:worst]:
+                print('    session {}: {ticks} ticks, score {score}, tick lag max {max_lag:.4f}s, '
+                      'average {average_lag:.4f}s, {skipped_frames} skipped frames'.format(session.id,**session.stats()))
+
+    async def serve(self,host = 'localhost',port = 2323,report = None):
+        """run the server until it is cancelled, printing its stats every report seconds if report is given"""
+        port = await self.start(host,port)
+        print('serving tetris on {}:{}'.format(host,port))
+        if report:
+            self._tasks.append(asyncio.ensure_future(self.report(report)))
+        async with self._server:
+            await self._server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'host tetris games over telnet')
+    parser.add_argument('--host',default = 'localhost')
+    parser.add_argument('--port',type = int,default = 2323)
+    parser.add_argument('--level',type = int,default = 0,help = 'level games start at')
+    parser.add_argument('--report',type = float,default = 10,help = 'seconds between printing the servers stats, 0 to not print them')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(Server(args.level).serve(args.host,args.port,args.report))
+    except KeyboardInterrupt:
+        pass
@@ -19,6 +19,20 @@ class Game_settings:
     SPEED_MULTIPLIER = .2
     STARTING_SPEED = .5
     LEVEL_SPACING = 5
+    FRAME_RATE = 60 #most frames drawn per second
+    CLEAR_TIME = .1 #fraction of a turn that full rows are shown before they are removed
+    GHOST = True    #show where the falling block will land
+    PIECE_MODE = 'uniform'  #'uniform' picks every piece at random, 'bag' deals pieces from shuffled bags of every shape
+    LOOKAHEAD = 5   #number of upcoming pieces generated ahead of time
+
+class Autoplay:
+    """weights the autoplayer scores the heap with after a placement, see Bot.py"""
+    HEIGHT = -.51   #sum of the column heights
+    HOLES = -.36    #empty cells with a block above them
+    BUMPINESS = -.18    #sum of the height differences between neighboring columns
+    LINES = .02     #multiplied by the Scoring.POINTS of the rows cleared
+    LOOKAHEAD = True    #also place the next piece before picking a placement
+    TABLE_SIZE = 100000 #most search results the autoplayer keeps in its transposition table
 
 class Dim:
     """constants setting the diminsions of elements on screen"""
@@ -41,6 +55,7 @@ class Symbols:
     BOARDER = '#'
     BOX = '*'
     FULL_ROW = '~'
+    GHOST = '.'
 
 class Scoring:
     """dictionary used to indicate scoring"""
@@ -68,6 +83,7 @@ class Movement:
     LEFT = 'left'
     RIGHT = 'right'
     ROTATE = 'rotate'
+    DROP = 'drop'
 
     MOVES = {
         DOWN:[0,-1],
@@ -75,6 +91,15 @@ class Movement:
         RIGHT:[1,0]
     }
 
+class Collision:
+    """results of testing if a block can be placed somewhere on the game board"""
+    NONE = 0    #nothing is in the way, the block can be placed there
+    FLOOR = 1   #the block is on the bottom of the boarder
+    HEAP = 2    #the block overlaps the block heap
+    BOARDER = 3 #the block overlaps the side of the boarder
+
+    LANDS = (FLOOR,HEAP)    #a block moving down into one of these is added to the heap
+
 class Input:
     """constants to check user input against"""
     PLAY = ['p','P']
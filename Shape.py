@@ -1,111 +1,135 @@
 """
 this file contains classes used to represent the following shapes for a tetris game
     shapes:Square,L,J,Line,T,S,Z
+
+every rotation of every shape is built once when this file is imported,
+shapes only keep the index of the rotation they are in, so rotating a shape just changes that index
 """
 from Settings import Symbols,Shape_coords
-import time
 
-import copy
+
+class Rotation():
+    """
+    This class describes one rotation of a shape, rotations are shared by every shape of the same type
+
+    a rotation is described by the following
+        coords: tuple of (x,y) coords describing the shape in this rotation
+        description: frozenset of the same coords, used for quick lookups
+        left,right,bottom,top: the smallest and largest x and y in coords
+        width: number of columns the rotation covers
+        column_bottoms: tuple of (x,y) for each column x in coords, where y is the lowest y in that column
+        masks: tuple of (y,mask) for each row y in coords, bit i of mask is set if (left + i,y) is in coords
+    """
+
+    __slots__ = ('coords','description','left','right','bottom','top','width','masks','column_bottoms')
+
+    def __init__(self,coords):
+        self.coords = tuple((x,y) for x,y in coords)
+        self.description = frozenset(self.coords)
+        self.left = min(x for x,y in self.coords)
+        self.right = max(x for x,y in self.coords)
+        self.bottom = min(y for x,y in self.coords)
+        self.top = max(y for x,y in self.coords)
+        self.width = self.right - self.left + 1
+
+        masks = {}
+        for x,y in self.coords:
+            masks[y] = masks.get(y,0) | 1 << (x - self.left)
+        self.masks = tuple(sorted(masks.items()))
+
+        bottoms = {}
+        for x,y in self.coords:
+            bottoms[x] = min(bottoms.get(x,y),y)
+        self.column_bottoms = tuple(sorted(bottoms.items()))
+
+
+def build_rotations(coords,count = 4):
+    """
+        build count rotations of coords, each rotation is done using the equations
+            new_y = -old_x
+            new_x = old_y
+    """
+    rotations = [coords]
+    for i in range(count - 1):
+        rotations.append([(y,-x) for x,y in rotations[-1]])
+    return tuple(Rotation(rotation) for rotation in rotations)
 
 
 class Shape():
     """
         This class is the parent to all other shape on a tetris board
-        Shape have a description used to describe the shape
+        Shapes have a tuple of rotations, and the index of the rotation they are currently in
         Shapes have a symbol that is used to represent the shape on the screen
+        
+        shapes only store their rotation index, every shape type sets __slots__ so shapes have no __dict__
     """
+    __slots__ = ('rotation',)
+    ROTATIONS = ()
+    symbol = None
+
+    def __init__(self,rotation = 0):
+        self.rotation = rotation
+
+    @property
+    def state(self):
+        """the rotation the shape is currently in"""
+        return self.ROTATIONS[self.rotation]
 
-    def __init__(self):
-        #description is as a list of [x,y] coordinantes 
-        self._description = []
-        self.symbol = None
-   
     @property
     def description(self):
-        return self._description
-    
-    @description.setter
-    def description(self,coords):
-        """
-            I want to copy the coords into the description, when setting it
-            not get a reference to those coords
-        """ 
-        
-        #descriptions are lists of lists,so use a deepcopy
-        self._description = copy.deepcopy(coords)
- 
+        #description is a frozenset of (x,y) coordinantes
+        return self.ROTATIONS[self.rotation].description
+
     def rotate(self):
-        #rotations is done using the equations
-        #new_y = -old_x 
-        #new_x = old_y
-        self.description = [[y,-x] for x,y in self.description]
-    
+        self.rotation = (self.rotation + 1) % len(self.ROTATIONS)
+
     def un_rotate(self):
-        #un rotate the shape according to the inverse of the rotation equations
-        self.description = [[-y,x] for x,y in self.description]
+        self.rotation = (self.rotation - 1) % len(self.ROTATIONS)
 
 
 class Square(Shape):
-    
-    def __init__(self):
-        self.description = Shape_coords.SQUARE
-        self.symbol = Symbols.SQUARE
-
-    def rotate(self):
-        #square is symetrical, so no rotation needed
-        pass
-    
-    def un_rotate(self):
-        pass
+    __slots__ = ()
+    #square is symetrical, so it only has one rotation
+    ROTATIONS = (Rotation(Shape_coords.SQUARE),)
+    symbol = Symbols.SQUARE
 
 
 class L(Shape):
-    
-    def __init__(self):
-        self.description = Shape_coords.L
-        self.symbol = Symbols.L
+    __slots__ = ()
+    ROTATIONS = build_rotations(Shape_coords.L)
+    symbol = Symbols.L
 
 
 class J(Shape):
-    
-    def __init__(self):
-        self.description = Shape_coords.J
-        self.symbol = Symbols.J
+    __slots__ = ()
+    ROTATIONS = build_rotations(Shape_coords.J)
+    symbol = Symbols.J
 
 
 class Line(Shape):
-    
-    def __init__(self):
-        self.description = Shape_coords.LINE_HORIZONTAL
-        self.symbol = Symbols.LINE
-
-    def rotate(self):
-        #switch line to the opposite position
-        if self.description == Shape_coords.LINE_HORIZONTAL:
-            self.description = Shape_coords.LINE_VERTICAL
-        else:
-            self.description = Shape_coords.LINE_HORIZONTAL
-         
-    def un_rotate(self):
-        self.rotate() 
+    __slots__ = ()
+    #line switches between a horizontal and vertical position
+    ROTATIONS = (Rotation(Shape_coords.LINE_HORIZONTAL),Rotation(Shape_coords.LINE_VERTICAL))
+    symbol = Symbols.LINE
 
 
 class T(Shape):
-    
-    def __init__(self):
-        self.description = Shape_coords.T
-        self.symbol = Symbols.T
+    __slots__ = ()
+    ROTATIONS = build_rotations(Shape_coords.T)
+    symbol = Symbols.T
 
 
 class S(Shape):
-    
-    def __init__(self):
-        self.description = Shape_coords.S
-        self.symbol = Symbols.S
+    __slots__ = ()
+    ROTATIONS = build_rotations(Shape_coords.S)
+    symbol = Symbols.S
 
 
 class Z(Shape):
-    
-    def __init__(self):
-        self.description = Shape_coords.Z 
-        self.symbol = Symbols.Z
+    __slots__ = ()
+    ROTATIONS = build_rotations(Shape_coords.Z)
+    symbol = Symbols.Z
+
+
+#every shape type, in the order shapes are picked from when generating a random shape
+SHAPES = (J,Square,L,T,Line,S,Z)
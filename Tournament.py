@@ -0,0 +1,195 @@
+"""
+this file contains the tournament runner, which plays large numbers of seeded headless games with the autoplayer,
+spread over a pool of worker processes, used to compare changes to the settings
+
+each worker process is started once, builds its own Bot, and is handed seeds in chunks,
+the result of each game is sent back as soon as it is finished and added to running totals,
+so a tournament of any number of games never keeps the results of all of them in memory
+
+settings can be changed for a tournament with --set, the change is made in every worker before it plays any games:
+    python3 Tournament.py --games 1000 --set Game_settings.LEVEL_SPACING=10 --set Autoplay.HOLES=-.5
+    python3 Tournament.py --games 1000 --set "Scoring.POINTS={0:0,1:100,2:300,3:500,4:800}"
+"""
+from Bot import Bot,play_game
+import Settings
+
+import argparse
+import ast
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+#results of each game, in the order they are printed
+FIELDS = ('score','level','lines','pieces','ticks','game_time','seconds')
+
+#games are cut off after this many pieces, since the autoplayer can play some seeds forever
+MAX_PIECES = 1000
+
+def parse_setting(setting):
+    """turns a 'Class.NAME=value' string into (class name,name,value), the value is read as a python literal"""
+    name,value = setting.split('=',1)
+    cls,name = name.strip().split('.')
+    if not hasattr(getattr(Settings,cls,None),name):
+        raise ValueError('there is no setting {}.{}'.format(cls,name))
+    return cls,name,ast.literal_eval(value.strip())
+
+def apply_settings(settings):
+    """set each (class name,name,value) in settings on the classes in Settings.py"""
+    for cls,name,value in settings:
+        setattr(getattr(Settings,cls),name,value)
+
+#the bot and game limit of a worker process, set by init_worker
+_bot = None
+_max_pieces = MAX_PIECES
+
+def init_worker(settings,max_pieces):
+    """called once in each worker process when the pool starts it"""
+    global _bot,_max_pieces
+    apply_settings(settings)
+    #the bot is built after the settings are changed, so it is built with the changed autoplay settings
+    _bot = Bot(lookahead = Settings.Autoplay.LOOKAHEAD,table_size = Settings.Autoplay.TABLE_SIZE)
+    _max_pieces = max_pieces
+
+def play(seed):
+    """play the game started from seed in a worker, returns its result as a dict of FIELDS, and the workers pid"""
+    start = time.perf_counter()
+    #the piece mode is looked up here, since the default argument was read before the settings were changed
+    engine,pieces,game_time = play_game(seed,_bot,_max_pieces,Settings.Game_settings.PIECE_MODE)
+    return {
+        'seed':seed,
+        'worker':os.getpid(),
+        'score':engine.score,
+        'level':engine.level,
+        'lines':engine.total_lines_cleared,
+        'pieces':pieces,
+        'ticks':engine.ticks,
+        'game_time':game_time,
+        'seconds':time.perf_counter() - start,
+        'game_over':engine.game_over}
+
+
+class Running_stats():
+    """
+    The running stats class keeps the count, mean, spread and range of a stream of values,
+    without keeping the values (welfords algorithm)
+    """
+
+    __slots__ = ('count','mean','_m2','min','max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0
+        self._m2 = 0
+        self.min = None
+        self.max = None
+
+    def add(self,value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta*(value - self.mean)
+        self.min = value if self.min is None else min(self.min,value)
+        self.max = value if self.max is None else max(self.max,value)
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0
+
+    def summary(self):
+        return {'mean':self.mean,'stdev':self.stdev,'min':self.min,'max':self.max}
+
+
+class Tournament():
+    """
+    The tournament class adds up the results of games as they come in
+
+    a tournament is described by the following
+        stats: {field:Running_stats} for each of FIELDS
+        games: number of games added
+        games_over: number of games that were lost before being cut off
+        workers: {pid:[games,seconds]} of the games each worker played, and the seconds it spent playing them
+        started: time the tournament started
+    """
+
+    def __init__(self):
+        self.stats = {field:Running_stats() for field in FIELDS}
+        self.games = 0
+        self.games_over = 0
+        self.workers = {}
+        self.started = time.perf_counter()
+
+    def add(self,result):
+        self.games += 1
+        self.games_over += result['game_over']
+        for field in FIELDS:
+            self.stats[field].add(result[field])
+        worker = self.workers.setdefault(result['worker'],[0,0])
+        worker[0] += 1
+        worker[1] += result['seconds']
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        """returns the tournaments totals as a dict that can be saved as json"""
+        seconds = self.seconds
+        return {
+            'games':self.games,
+            'games_over':self.games_over,
+            'seconds':seconds,
+            'games_per_second':self.games / seconds,
+            'workers':{str(pid):{'games':games,'games_per_second':games / busy if busy else 0}
+                       for pid,(games,busy) in self.workers.items()},
+            'results':{field:stats.summary() for field,stats in self.stats.items()}}
+
+def run(games,seed = 0,workers = None,chunksize = None,settings = (),max_pieces = MAX_PIECES,out = None):
+    """
+        play games games with seeds from seed up, on a pool of workers processes, one per cpu core if workers is None
+        the result of each game is written to out as a line of json if out is given
+        returns the Tournament with the totals of every game
+    """
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:   #big enough chunks to keep the workers busy, small enough to share the games out evenly
+        chunksize = max(1,games // (workers*8))
+    tournament = Tournament()
+    with multiprocessing.Pool(workers,init_worker,(list(settings),max_pieces)) as pool:
+        for result in pool.imap_unordered(play,range(seed,seed + games),chunksize):
+            tournament.add(result)
+            if out is not None:
+                out.write(json.dumps(result) + '\n')
+    return tournament
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'play many headless games with the autoplayer on a pool of processes')
+    parser.add_argument('--games',type = int,default = 100)
+    parser.add_argument('--seed',type = int,default = 0,help = 'seed of the first game, each game after it uses the next seed')
+    parser.add_argument('--workers',type = int,help = 'number of worker processes, defaults to one per cpu core')
+    parser.add_argument('--chunk',type = int,help = 'number of games handed to a worker at once')
+    parser.add_argument('--pieces',type = int,default = MAX_PIECES,help = 'stop each game after this many pieces')
+    parser.add_argument('--set',action = 'append',default = [],metavar = 'CLASS.NAME=VALUE',
+                        help = 'change a setting in Settings.py for every game, can be given more than once')
+    parser.add_argument('--results',metavar = 'FILE',help = 'write the result of each game to FILE as lines of json')
+    parser.add_argument('--json',action = 'store_true',help = 'print the totals as json')
+    args = parser.parse_args()
+
+    settings = [parse_setting(setting) for setting in args.set]
+    out = open(args.results,'w') if args.results else None
+    tournament = run(args.games,args.seed,args.workers,args.chunk,settings,args.pieces,out)
+    if out is not None:
+        out.close()
+
+    summary = tournament.summary()
+    if args.json:
+        json.dump(summary,sys.stdout,indent = 1)
+        raise SystemExit
+    print('{games} games ({games_over} lost) in {seconds:.3f}s, {games_per_second:.2f} games/s'.format(**summary))
+    for field,stats in summary['results'].items():
+        print('{:10} mean {:>12.2f}  stdev {:>10.2f}  min {:>10.2f}  max {:>10.2f}'.format(field,stats['mean'],stats['stdev'],
+              stats['min'],stats['max']))
+    for pid,worker in summary['workers'].items():
+        print('worker {}: {} games, {:.2f} games/s'.format(pid,worker['games'],worker['games_per_second']))
@@ -0,0 +1,204 @@
+"""
+this file contains the vector env class, which steps many headless games at once, for training agents
+
+the games are split into slices, one for each worker process, and each worker runs the Engines of its slice
+the actions, observations, rewards and done flags of every game are kept in one block of shared memory,
+the parent writes the actions into it and tells the workers to step, and each worker writes the results
+of its slice straight into it, so boards are never pickled between processes
+
+the observation of each game is made up of
+    grid: (BOARD_H,BOARD_W) uint8 array, grid[y][x] is 1 if the heap has a block at [x,y], in heap coords
+    piece: the falling blocks shape index in SHAPES, its rotation index, its x and y in heap coords,
+        and the next blocks shape index
+
+actions are the action codes used by Batch_engine, 0 does nothing and the rest are the actions in Engine.ACTIONS
+
+    with Vector_env(range(256),workers = 4) as env:
+        grid,piece = env.reset()
+        (grid,piece),rewards,done = env.step(actions)
+
+this file requires numpy
+"""
+from Engine import Engine
+from Batch_engine import ACTIONS
+from Shape import SHAPES
+from Settings import Dim,Game_settings
+
+import multiprocessing
+import os
+import numpy as np
+from multiprocessing import shared_memory
+
+#commands sent to the workers
+RESET = 'reset'
+STEP = 'step'
+CLOSE = 'close'
+
+#fields of a pieces observation
+SHAPE,ROTATION,X,Y,NEXT_SHAPE = range(5)
+
+#name,dtype and shape of each game of the arrays kept in shared memory
+ARRAYS = (
+    ('grid',np.uint8,(Dim.BOARD_H,Dim.BOARD_W)),
+    ('piece',np.int64,(NEXT_SHAPE + 1,)),
+    ('actions',np.uint8,()),
+    ('rewards',np.int64,()),
+    ('done',np.bool_,()),
+    ('score',np.int64,()))
+
+#the cells of every heap row mask, MASK_CELLS[mask][x] is 1 if bit x of mask is set
+MASK_CELLS = ((np.arange(1 << Dim.BOARD_W)[:,None] >> np.arange(Dim.BOARD_W)) & 1).astype(np.uint8)
+
+def layout(n):
+    """returns the size of the shared memory for n games, and {name:(offset,dtype,shape)} of each array in it"""
+    offset = 0
+    arrays = {}
+    for name,dtype,shape in ARRAYS:
+        shape = (n,) + shape
+        arrays[name] = (offset,dtype,shape)
+        size = np.dtype(dtype).itemsize*int(np.prod(shape))
+        offset += -(-size // 8)*8  #each array starts 8 byte aligned
+    return offset,arrays
+
+def attach(buffer,n):
+    """returns {name:array} of the arrays for n games in buffer"""
+    size,arrays = layout(n)
+    return {name:np.ndarray(shape,dtype,buffer,offset) for name,(offset,dtype,shape) in arrays.items()}
+
+def observe(engine,grid,piece):
+    """write the observation of engines game into its grid and piece arrays"""
+    board = engine.screen.game_board
+    rows = board.block_heap.rows[:Dim.BOARD_H]
+    grid[:len(rows)] = MASK_CELLS[rows]
+    grid[len(rows):] = 0
+    block = board.block
+    piece[SHAPE] = SHAPES.index(type(block.shape))
+    piece[ROTATION] = block.shape.rotation
+    piece[X] = block.location[0] - board.location[0]
+    piece[Y] = block.location[1] - board.location[1]
+    piece[NEXT_SHAPE] = SHAPES.index(type(engine.screen.next_block.block.shape))
+
+def worker(conn,name,n,start,seeds,auto_reset,piece_mode):
+    """
+        run the games start to start + len(seeds) of a vector env of n games, in a worker process
+        waits for commands from conn, does them to its games, and sends None back once the results are in shared memory
+    """
+    memory = shared_memory.SharedMemory(name)
+    arrays = attach(memory.buf,n)
+    games = range(start,start + len(seeds))
+    grid,piece,actions,rewards,done,score = (arrays[name][start:games.stop] for name,dtype,shape in ARRAYS)
+    next_seeds = list(seeds)    #seed of the game each game i is playing, seeds is kept to reset from
+    engines = [Engine(seed,piece_mode) for seed in seeds]
+    while True:
+        command = conn.recv()
+        if command == CLOSE:
+            break
+        for i,engine in enumerate(engines):
+            if command == RESET:
+                next_seeds[i] = seeds[i]
+                engine.reset(seeds[i])
+                rewards[i] = 0
+                done[i] = False
+            else:
+                last_score,lost = engine.score,engine.game_over
+                action = ACTIONS[actions[i]]
+                if action is not None:
+                    engine.step(action)
+                engine.tick()
+                rewards[i] = engine.score - last_score
+                done[i] = engine.game_over and not lost
+            score[i] = engine.score
+            #lost games are restarted straight away, game i's k-th game since the last reset uses seed seeds[i] + k x n
+            if auto_reset and engine.game_over:
+                next_seeds[i] += n
+                engine.reset(next_seeds[i])
+            observe(engine,grid[i],piece[i])
+        conn.send(None)
+    #the arrays have to be let go of before the shared memory can be closed
+    del arrays,grid,piece,actions,rewards,done,score
+    memory.close()
+
+
+class Vector_env():
+    """
+    The vector env class steps n games at once, on a number of worker processes
+
+    a vector env is described by the following arrays, indexed by game, they are in shared memory,
+    and are updated in place by reset() and step()
+        grid,piece: the observation of each game
+        rewards: the score gained in each game during the last step, from Engine.update_score
+        done: true for games that were lost during the last step
+        score: the score of each game, for games that were lost this is their final score
+
+    when auto_reset is set, lost games are restarted during the step they were lost in,
+        so their observation is the start of the next game, the same as in Batch_engine,
+        reset() starts every game again from the seed it was made with
+    """
+
+    def __init__(self,seeds,workers = None,auto_reset = True,piece_mode = Game_settings.PIECE_MODE):
+        """one worker process is started per cpu core if workers is None, there are never more workers than games"""
+        seeds = list(seeds)
+        self.n = len(seeds)
+        self.workers = max(1,min(workers or os.cpu_count() or 1,self.n))
+        size,arrays = layout(self.n)
+        self.memory = shared_memory.SharedMemory(create = True,size = size)
+        for name,array in attach(self.memory.buf,self.n).items():
+            setattr(self,name,array)
+        self.steps = 0
+
+        self._conns = []
+        self._processes = []
+        for games in np.array_split(np.arange(self.n),self.workers):
+            conn,worker_conn = multiprocessing.Pipe()
+            start = int(games[0])
+            process = multiprocessing.Process(target = worker,daemon = True,
+                                              args = (worker_conn,self.memory.name,self.n,start,
+                                                      seeds[start:start + len(games)],auto_reset,piece_mode))
+            process.start()
+            worker_conn.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+
+    def run(self,command):
+        """send command to every worker, then wait for all of them to finish it"""
+        for conn in self._conns:
+            conn.send(command)
+        for conn in self._conns:
+            conn.recv()
+
+    def reset(self):
+        """
+            restart every game from the seed it was given when the env was made, even if it has been auto reset since,
+            returns the observations (grid,piece)
+        """
+        self.run(RESET)
+        return self.grid,self.piece
+
+    def step(self,actions):
+        """
+            do actions[i] (an action code) in game i, followed by one gravity tick in every game
+            returns ((grid,piece),rewards,done), these are the shared arrays, so they are overwritten by the next step
+        """
+        self.actions[:] = actions
+        self.run(STEP)
+        self.steps += 1
+        return (self.grid,self.piece),self.rewards,self.done
+
+    def close(self):
+        if self.memory is None:
+            return
+        for conn in self._conns:
+            conn.send(CLOSE)
+        for process in self._processes:
+            process.join()
+        for name,dtype,shape in ARRAYS:
+            delattr(self,name)
+        self.memory.close()
+        self.memory.unlink()
+        self.memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
@@ -1,7 +1,38 @@
 from Game import Game
+from Profiler import Profiler,Phase_timer,write_report
 
-game = Game()
+import argparse
+import time
 
-if game.start():
-    while game.play():
-        continue
+parser = argparse.ArgumentParser(description = 'play tetris in the terminal')
+parser.add_argument('--seed',type = int,help = 'seed used to pick the pieces, games with the same seed get the same pieces')
+parser.add_argument('--record',metavar = 'FILE',help = 'record the game to a replay file, see Replay.py')
+parser.add_argument('--autoplay',action = 'store_true',help = 'let the autoplayer play the game, press q to exit')
+parser.add_argument('--broadcast',type = int,metavar = 'PORT',
+                    help = 'let spectators watch the game on PORT, with python3 Broadcast.py --port PORT')
+parser.add_argument('--profile',metavar = 'NAME',
+                    help = 'profile the game, writing a report to NAME.txt and collapsed stacks for a flamegraph to NAME.collapsed')
+args = parser.parse_args()
+
+game = Game(args.seed,args.record,args.autoplay,args.broadcast)
+
+#the autoplayer starts straight away, so it can be left running without anyone at the terminal
+if args.autoplay or game.start():
+    if args.profile:
+        phase_timer = Phase_timer()
+        phase_timer.time_game(game)
+        start = time.perf_counter()
+        with Profiler() as profiler:
+            while game.play():
+                continue
+        write_report(args.profile + '.txt',profiler,phase_timer,time.perf_counter() - start)
+        profiler.write_collapsed(args.profile + '.collapsed')
+        print('profile written to {0}.txt and {0}.collapsed'.format(args.profile))
+    else:
+        while game.play():
+            continue
+
+if game.publisher:
+    for viewer,stats in enumerate(game.publisher.stats()['subscribers']):
+        print('spectator {}: {:.0f} bytes/s for {:.1f}s, {} frames sent, {} dropped'.format(viewer + 1,stats['bytes_per_second'],
+              stats['seconds'],stats['frames_sent'],stats['dropped_frames']))